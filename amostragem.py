@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def lttb(x, y, limite):
+    n = len(y)
+    if limite < 3 or n <= limite:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Primeiro e último pontos ficam fixos; os demais saem de limite - 2
+    # baldes, escolhendo em cada um o ponto que forma o maior triângulo com
+    # o ponto escolhido antes e a média do balde seguinte.
+    bordas = (np.arange(limite - 1) * ((n - 2) / (limite - 2))).astype(np.int64) + 1
+    bordas[-1] = n - 1
+    indices = np.empty(limite, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    anterior = 0
+    for balde in range(limite - 2):
+        inicio, fim = bordas[balde], bordas[balde + 1]
+        if balde + 2 < len(bordas):
+            seguinte = slice(bordas[balde + 1], bordas[balde + 2])
+            media_x, media_y = x[seguinte].mean(), y[seguinte].mean()
+        else:
+            media_x, media_y = x[-1], y[-1]
+
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        indices[balde + 1] = anterior
+    return indices
+
+
+def minmax(y, limite):
+    n = len(y)
+    if limite < 3 or n <= limite:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    tamanho = -(-n // max(1, (limite - 2) // 2))
+    baldes = -(-n // tamanho)
+    matriz = np.pad(y, (0, baldes * tamanho - n), mode='edge').reshape(baldes, tamanho)
+
+    inicio_baldes = np.arange(baldes) * tamanho
+    minimos = inicio_baldes + np.argmin(matriz, axis=1)
+    maximos = inicio_baldes + np.argmax(matriz, axis=1)
+    indices = np.concatenate([[0], minimos, maximos, [n - 1]])
+    return np.unique(np.minimum(indices, n - 1))
+
+
+def amostrar(x, y, limite, metodo='lttb'):
+    if metodo == 'minmax':
+        return minmax(y, limite)
+    if metodo == 'lttb':
+        return lttb(x, y, limite)
+    raise ValueError(f"Método de amostragem desconhecido: {metodo}")
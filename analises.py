@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from armazenamento import COLUNAS_VALORES, para_centavos, para_reais
+
+
+def _somas_janela(chaves, acumulado, meses):
+    # Soma dos meses em (chave - meses, chave] e quantos deles existem; meses
+    # ausentes não entram, então a média só vale com a janela completa.
+    inicio = np.searchsorted(chaves, chaves - meses + 1)
+    fim = np.arange(1, len(chaves) + 1)
+    return acumulado[fim] - acumulado[inicio], fim - inicio
+
+
+def calcular_analises(mensal):
+    # mensal tem um mês por linha, ordenado por ano e mes_num. As janelas
+    # olham no máximo 12 meses para trás, então os valores de um ano só
+    # dependem dele e do ano anterior.
+    ano = mensal['ano'].to_numpy(np.int64)
+    chaves = ano * 12 + mensal['mes_num'].to_numpy(np.int64) - 1
+    valores = {coluna: mensal[coluna].to_numpy(np.float64) for coluna in COLUNAS_VALORES}
+    acumulados = {coluna: np.concatenate([[0], np.cumsum(para_centavos(v))]) for coluna, v in valores.items()}
+
+    resultado = {
+        'ano': mensal['ano'].to_numpy(),
+        'mes_num': mensal['mes_num'].to_numpy(),
+        'data': (chaves - 1970 * 12).astype('datetime64[M]').astype('datetime64[us]'),
+        **valores
+    }
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for meses in (3, 12):
+            soma, presentes = _somas_janela(chaves, acumulados['lucro'], meses)
+            resultado[f'media_movel_{meses}'] = np.where(presentes == meses, para_reais(soma) / meses, np.nan)
+
+        lucro_12, presentes = _somas_janela(chaves, acumulados['lucro'], 12)
+        receita_12, _ = _somas_janela(chaves, acumulados['receita'], 12)
+        resultado['margem_movel_12'] = np.where((presentes == 12) & (receita_12 > 0), lucro_12 / receita_12 * 100, np.nan)
+
+        posicao = np.minimum(np.searchsorted(chaves, chaves - 12), max(len(chaves) - 1, 0))
+        existe = chaves[posicao] == chaves - 12
+        for coluna in ('receita', 'lucro'):
+            anterior = valores[coluna][posicao]
+            resultado[f'crescimento_{coluna}'] = np.where(
+                existe & (anterior != 0), (valores[coluna] - anterior) / np.abs(anterior) * 100, np.nan
+            )
+
+        inicio_ano = np.searchsorted(chaves, ano * 12)
+        for coluna in COLUNAS_VALORES:
+            resultado[f'acumulado_{coluna}'] = para_reais(acumulados[coluna][1:] - acumulados[coluna][inicio_ano])
+
+    return pd.DataFrame(resultado)
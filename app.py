@@ -1,13 +1,60 @@
+import os
+import sys
+if os.environ.get('DASHBOARD_INICIO_RAPIDO') == '1':
+    # A integração do Dash com o Jupyter importa o IPython inteiro só para
+    # saber se está num notebook; sem ele o Dash segue sem a integração.
+    sys.modules.setdefault('IPython', None)
 import dash
-from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output
-import plotly.express as px
+from dash import Patch, ctx, dcc, html, dash_table, no_update, set_props
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import pandas as pd
 import numpy as np
+import base64
+import hashlib
+import itertools
 import json
-from datetime import datetime
-from flask import Flask
+import logging
+import math
+import multiprocessing
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from flask import Flask, Response, g, request
+
+from amostragem import amostrar
+from analises import calcular_analises
+from metricas import PerfisLentos, Registro
+from armazenamento import MESES, abrir_armazenamento, agregar_colunas, json_para_colunas, para_centavos, para_reais
+from cache import CacheLRU
+import compartilhado
+import compressao
+import exportacao
+from oficinas import GerenciadorOficinas, medir_memoria
+from recarga import MonitorDiretorio, carregar_diretorio, meses_alterados, mesclar_dados
+from tarefas import FilaTarefas
+
+logger = logging.getLogger(__name__)
+
+registro_metricas = Registro()
+etapas = registro_metricas.histograma(
+    'dashboard_etapa_segundos', 'Tempo gasto em cada etapa do dashboard (etapas podem se sobrepor)', ['etapa']
+)
+duracao_requisicoes = registro_metricas.histograma(
+    'dashboard_requisicao_segundos', 'Duração das requisições por rota ou callback', ['rota']
+)
+respostas = registro_metricas.contador('dashboard_respostas_total', 'Respostas por rota ou callback e status', ['rota', 'status'])
+memoria_oficinas = registro_metricas.medidor(
+    'dashboard_oficina_memoria_bytes', 'Memória estimada dos dados, agregados e caches de cada oficina carregada', ['oficina']
+)
 
 dados_oficina_json = {
     "2023": {
@@ -50,38 +97,717 @@ dados_oficina_json = {
 }
 
 def json_para_dataframe(dados_json):
-    rows = []
-    for ano, meses in dados_json.items():
-        for mes, valores in meses.items():
-            mes_num = {
-                'Janeiro': 1, 'Fevereiro': 2, 'Março': 3, 'Abril': 4,
-                'Maio': 5, 'Junho': 6, 'Julho': 7, 'Agosto': 8,
-                'Setembro': 9, 'Outubro': 10, 'Novembro': 11, 'Dezembro': 12
-            }[mes]
-            
-            data = datetime(int(ano), mes_num, 1)
-            
-            rows.append({
-                'data': data,
-                'ano': int(ano),
-                'mes': mes,
-                'mes_num': mes_num,
-                'mes_ano': f"{mes[:3]}/{ano}",
-                'receita': valores['receita'],
-                'despesas': valores['despesas'],
-                'lucro': valores['lucro']
-            })
+    return colunas_para_dataframe(**json_para_colunas(dados_json))
+
+def colunas_para_dataframe(ano, mes_num, receita, despesas, lucro, dia=None):
+    ano = np.asarray(ano, dtype=np.int16)
+    mes_num = np.asarray(mes_num, dtype=np.int8)
+    
+    chave_mes = (ano.astype(np.int32) - 1970) * 12 + (mes_num - 1)
+    data = chave_mes.astype('datetime64[M]').astype('datetime64[D]')
+    if dia is not None:
+        data = data + (np.asarray(dia, dtype=np.int16) - 1)
     
-    return pd.DataFrame(rows).sort_values('data')
+    df = pd.DataFrame({
+        'data': data.astype('datetime64[us]'),
+        'ano': ano,
+        'mes': pd.Categorical.from_codes(mes_num - 1, categories=MESES),
+        'mes_num': mes_num,
+        'mes_ano': rotular_mes_ano(chave_mes),
+        # Centavos em int64, como no armazenamento; reais só na montagem dos
+        # gráficos, da tabela e da exportação.
+        'receita': para_centavos(receita),
+        'despesas': para_centavos(despesas),
+        'lucro': para_centavos(lucro)
+    })
+    
+    valores_data = df['data'].to_numpy()
+    if len(df) > 1 and (valores_data[1:] < valores_data[:-1]).any():
+        df = df.iloc[np.argsort(valores_data, kind='stable')].reset_index(drop=True)
+    return df
+
+def rotular_mes_ano(chave_mes):
+    meses_unicos, inverso = np.unique(chave_mes, return_inverse=True)
+    rotulos = [f"{MESES[m % 12][:3]}/{m // 12 + 1970}" for m in meses_unicos.tolist()]
+    return pd.Categorical.from_codes(inverso.reshape(-1), categories=rotulos)
+
+def mesclar_linhas(df, novas_linhas):
+    # Os meses recebidos substituem por inteiro as linhas do mesmo mês.
+    chave_df = df['ano'].to_numpy(np.int32) * 12 + df['mes_num'].to_numpy(np.int32)
+    chave_novas = novas_linhas['ano'].to_numpy(np.int32) * 12 + novas_linhas['mes_num'].to_numpy(np.int32)
+    partes = [df[~np.isin(chave_df, chave_novas)], novas_linhas]
+    juntar = lambda coluna: np.concatenate([parte[coluna].to_numpy() for parte in partes])
+    return colunas_para_dataframe(
+        juntar('ano'),
+        juntar('mes_num'),
+        juntar('receita'),
+        juntar('despesas'),
+        juntar('lucro'),
+        np.concatenate([parte['data'].dt.day.to_numpy() for parte in partes])
+    )
 
 def formatar_real(valor):
     return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
-df = json_para_dataframe(dados_oficina_json)
+LIMITE_FORMATACAO_VETORIZADA = 1e13
+
+def formatar_real_serie(valores, cache=None, tamanho_maximo_cache=100_000):
+    valores = np.asarray(valores, dtype=np.float64).reshape(-1)
+    if cache is None:
+        return _formatar_reais(valores)
+    
+    textos = pd.Series(valores).map(cache).to_numpy(dtype=object)
+    faltando = pd.isna(textos)
+    if faltando.any():
+        novos_valores = valores[faltando]
+        novos_textos = _formatar_reais(novos_valores)
+        textos[faltando] = novos_textos
+        if len(cache) + len(novos_textos) > tamanho_maximo_cache:
+            cache.clear()
+        cache.update(zip(novos_valores.tolist(), novos_textos.tolist()))
+    return textos
+
+def _formatar_reais(valores):
+    if len(valores) == 0:
+        return np.array([], dtype=object)
+    
+    with np.errstate(invalid='ignore'):
+        escalado = np.abs(valores) * 100
+        meio_centavo = np.abs(np.abs(escalado - np.floor(escalado)) - 0.5) < np.maximum(1e-6, escalado * 1e-15)
+    # Perto da metade de um centavo a multiplicação por 100 pode arredondar
+    # diferente da formatação do Python; esses valores, os não finitos e os
+    # enormes ficam com formatar_real.
+    excecoes = meio_centavo | ~np.isfinite(valores) | (np.abs(valores) >= LIMITE_FORMATACAO_VETORIZADA)
+    centavos = np.where(excecoes, 0, np.rint(escalado)).astype(np.int64)
+    inteiros = centavos // 100
+    inteiros = inteiros.astype(np.uint32 if inteiros.max() < 2**32 else np.uint64)
+    
+    largura = len(str(int(inteiros.max())))
+    largura += -largura % 3
+    largura_inteiro = largura + largura // 3 - 1
+    
+    # Cada linha vira "R$ -1.234.567,89\n" numa matriz de bytes; as posições
+    # que não pertencem ao texto (sinal positivo, zeros à esquerda e seus
+    # separadores) são descartadas pela máscara antes de juntar tudo.
+    bytes_texto = np.empty((len(valores), largura_inteiro + 8), dtype=np.uint8)
+    manter = np.ones(bytes_texto.shape, dtype=bool)
+    bytes_texto[:, 0:3] = np.frombuffer(b'R$ ', dtype=np.uint8)
+    bytes_texto[:, 3] = ord('-')
+    manter[:, 3] = np.signbit(valores)
+    
+    restante = inteiros
+    for coluna in range(3 + largura_inteiro, 3, -1):
+        if (coluna - 4) % 4 == 3:
+            bytes_texto[:, coluna] = ord('.')
+            manter[:, coluna] = restante > 0
+            continue
+        restante, digito = np.divmod(restante, 10)
+        bytes_texto[:, coluna] = digito + ord('0')
+        if coluna < 3 + largura_inteiro:
+            manter[:, coluna] = (restante > 0) | (digito > 0)
+    
+    bytes_texto[:, -4] = ord(',')
+    bytes_texto[:, -3] = (centavos % 100) // 10 + ord('0')
+    bytes_texto[:, -2] = centavos % 10 + ord('0')
+    bytes_texto[:, -1] = ord('\n')
+    
+    textos = np.array(bytes_texto[manter].tobytes().decode('ascii').split('\n')[:-1], dtype=object)
+    if excecoes.any():
+        textos[excecoes] = [formatar_real(v) for v in valores[excecoes].tolist()]
+    return textos
+
+COLUNAS_VALORES = ['receita', 'despesas', 'lucro']
+
+NOMES_SERIES = ['Receitas', 'Despesas', 'Lucro']
+
+COLUNAS_TABELA = ['mes_ano', 'receita_formatada', 'despesas_formatada', 'lucro_formatado', 'margem']
+
+ORDENACAO_TABELA = {
+    'mes_ano': 'data',
+    'receita_formatada': 'receita',
+    'despesas_formatada': 'despesas',
+    'lucro_formatado': 'lucro',
+    'margem': 'margem'
+}
+
+@etapas.cronometrar('formatacao')
+def montar_tabela(linhas):
+    return pd.DataFrame({
+        'mes_ano': linhas['mes_ano'].to_numpy(),
+        'receita_formatada': formatar_real_serie(para_reais(linhas['receita'])),
+        'despesas_formatada': formatar_real_serie(para_reais(linhas['despesas'])),
+        'lucro_formatado': formatar_real_serie(para_reais(linhas['lucro'])),
+        'margem': (linhas['lucro'] / linhas['receita'] * 100).round(1).to_numpy()
+    }, columns=COLUNAS_TABELA)
+
+def indexar_ordens(linhas, tabela):
+    ordens = {}
+    for coluna, origem in ORDENACAO_TABELA.items():
+        valores = tabela[origem] if origem in tabela else linhas[origem]
+        ordem = np.argsort(valores.to_numpy(), kind='stable')
+        ordens[(coluna, 'asc')] = ordem
+        ordens[(coluna, 'desc')] = ordem[::-1]
+    return ordens
+
+def montar_visao(linhas, totais, anual, titulo_periodo, titulo_anual, tabela=None):
+    receita = float(totais['receita'])
+    despesas = float(totais['despesas'])
+    lucro = float(totais['lucro'])
+    if tabela is None:
+        tabela = montar_tabela(linhas)
+    return {
+        'linhas': linhas,
+        'anual': anual,
+        'tabela': tabela,
+        'ordens': indexar_ordens(linhas, tabela),
+        'titulo_periodo': titulo_periodo,
+        'titulo_anual': titulo_anual,
+        'receita': receita,
+        'despesas': despesas,
+        'lucro': lucro,
+        'margem': (lucro / receita * 100) if receita > 0 else 0
+    }
+
+ABREVIACOES_MESES = np.array([mes[:3] for mes in MESES], dtype=object)
+
+def construir_visao_ano(ano, linhas, totais, mensal):
+    anual = mensal.reset_index(drop=True)
+    anual['x'] = ABREVIACOES_MESES[anual['mes_num'].to_numpy() - 1]
+    return montar_visao(linhas, totais, anual, f"Ano {ano}", f'Comparativo Mensal - {ano}')
+
+def construir_visao_todos(df, total, visoes_anos):
+    anos = sorted(visoes_anos)
+    anual = pd.DataFrame({
+        'ano': np.array(anos, dtype=df['ano'].dtype),
+        **{coluna: [visoes_anos[ano][coluna] for ano in anos] for coluna in COLUNAS_VALORES}
+    })
+    anual['x'] = anual['ano']
+    tabela = pd.concat([visoes_anos[ano]['tabela'] for ano in anos], ignore_index=True) if anos else None
+    return montar_visao(df, total, anual, "Todos os Anos", 'Comparativo por Ano', tabela)
+
+@etapas.cronometrar('agregacao')
+def construir_cubo(df, cubo_anterior=None, anos_afetados=(), agregados=None):
+    # Os totais e agrupamentos vêm do armazenamento quando ele os calcula;
+    # com um cubo anterior, só os anos afetados são recalculados.
+    if agregados is None:
+        agregados = agregar_colunas(df)
+    mensal_por_ano = dict(tuple(agregados['por_ano_mes'].groupby('ano')))
+    cubo = {}
+    for ano, posicoes in df.groupby('ano').indices.items():
+        ano = int(ano)
+        if cubo_anterior is not None and ano in cubo_anterior and ano not in anos_afetados:
+            cubo[ano] = cubo_anterior[ano]
+        else:
+            # O df é ordenado por data, então cada ano é uma fatia contígua.
+            linhas = df.iloc[posicoes[0]:posicoes[-1] + 1]
+            cubo[ano] = construir_visao_ano(ano, linhas, agregados['por_ano'].loc[ano], mensal_por_ano[ano])
+    cubo['todos'] = construir_visao_todos(df, agregados['total'], cubo)
+    return cubo
+
+@etapas.cronometrar('paginacao')
+def paginar_tabela(visao, pagina, tamanho_pagina, ordenacao):
+    total = len(visao['tabela'])
+    paginas = max(1, math.ceil(total / tamanho_pagina))
+    pagina = min(max(pagina, 0), paginas - 1)
+    inicio = pagina * tamanho_pagina
+    
+    ordem = None
+    if ordenacao:
+        ordem = visao['ordens'].get((ordenacao[0]['column_id'], ordenacao[0]['direction']))
+    if ordem is None:
+        fatia = visao['tabela'].iloc[inicio:inicio + tamanho_pagina]
+    else:
+        fatia = visao['tabela'].iloc[ordem[inicio:inicio + tamanho_pagina]]
+    
+    return fatia.to_dict('records'), paginas, pagina
+
+def codificar_array(valores, dtype):
+    valores = np.ascontiguousarray(valores, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {'dtype': dtype, 'bdata': base64.b64encode(valores.tobytes()).decode('ascii')}
+
+@etapas.cronometrar('dados_cliente')
+def montar_dados_cliente(df, cubo):
+    todos = cubo['todos']
+    anos = sorted(chave for chave in cubo if chave != 'todos')
+    mensal = pd.concat([cubo[ano]['anual'] for ano in anos]) if anos else todos['anual'].iloc[0:0]
+    
+    visoes = {}
+    for chave, visao in cubo.items():
+        visoes[str(chave)] = {
+            'titulo_periodo': visao['titulo_periodo'],
+            'titulo_anual': visao['titulo_anual'],
+            'totais': [visao['receita'], visao['despesas'], visao['lucro'], visao['margem']]
+        }
+    
+    return {
+        'linhas': {
+            'data': codificar_array(df['data'].to_numpy().astype('datetime64[D]').astype(np.int64), 'i4'),
+            'ano': codificar_array(df['ano'], 'i2'),
+            'mes_ano': codificar_array(df['mes_ano'].cat.codes, 'i4'),
+            'receita': codificar_array(para_reais(df['receita']), 'f8'),
+            'despesas': codificar_array(para_reais(df['despesas']), 'f8'),
+            'lucro': codificar_array(para_reais(df['lucro']), 'f8'),
+            'margem': codificar_array(todos['tabela']['margem'], 'f8')
+        },
+        'rotulos_mes_ano': [str(rotulo) for rotulo in df['mes_ano'].cat.categories],
+        'anual': {
+            'ano': codificar_array(todos['anual']['ano'], 'i2'),
+            'receita': codificar_array(todos['anual']['receita'], 'f8'),
+            'despesas': codificar_array(todos['anual']['despesas'], 'f8'),
+            'lucro': codificar_array(todos['anual']['lucro'], 'f8')
+        },
+        'mensal': {
+            'ano': codificar_array(mensal['ano'], 'i2'),
+            'mes_num': codificar_array(mensal['mes_num'], 'u1'),
+            'receita': codificar_array(mensal['receita'], 'f8'),
+            'despesas': codificar_array(mensal['despesas'], 'f8'),
+            'lucro': codificar_array(mensal['lucro'], 'f8')
+        },
+        'abreviacoes_meses': [mes[:3] for mes in MESES],
+        'visoes': visoes,
+        'modelo_cards': serializar_saida(montar_cards(todos))
+    }
+
+@etapas.cronometrar('filtro')
+def obter_visao(ano_selecionado, atual=None):
+    atual = estado if atual is None else atual
+    if ano_selecionado in atual['cubo']:
+        return atual['cubo'][ano_selecionado]
+    return montar_visao(
+        atual['df'].iloc[0:0],
+        dict.fromkeys(COLUNAS_VALORES, 0),
+        pd.DataFrame({'x': [], 'receita': [], 'despesas': [], 'lucro': []}),
+        f"Ano {ano_selecionado}",
+        f'Comparativo Mensal - {ano_selecionado}'
+    )
+
+GRANULARIDADES = {
+    'dia': ('Dia', 'Diária', '%d/%m/%Y'),
+    'semana': ('Semana', 'Semanal', '%d/%m/%Y'),
+    'mes': ('Mês', 'Mensal', '%b/%Y'),
+    'trimestre': ('Trimestre', 'Trimestral', '%b/%Y'),
+    'ano': ('Ano', 'Anual', '%Y')
+}
+
+def indexar_datas(df, acumulados=None):
+    # Somas acumuladas sobre o df ordenado por data: o total das linhas
+    # [i, j) é acumulado[j] - acumulado[i], e i e j saem de uma busca
+    # binária nas datas. Em centavos, como o df, a diferença é exata mesmo
+    # longe do começo da série. Os trabalhadores recebem as somas prontas do
+    # arquivo compartilhado.
+    if acumulados is None:
+        acumulados = {
+            coluna: np.concatenate([[0], np.cumsum(df[coluna].to_numpy(), dtype=np.int64)]) for coluna in COLUNAS_VALORES
+        }
+    meses, anos = indexar_meses(df)
+    return {
+        'datas': df['data'].to_numpy(),
+        'periodos': {},
+        'meses': meses,
+        'anos': anos,
+        **acumulados
+    }
+
+def indexar_meses(df):
+    # Onde começa e termina cada (ano, mês) e cada ano no df ordenado por
+    # data: filtrar um deles é pegar uma fatia, sem máscara sobre o df.
+    chave = df['ano'].to_numpy(np.int32) * 12 + df['mes_num'].to_numpy(np.int32) - 1
+    if len(chave) == 0:
+        return {}, {}
+    bordas = np.concatenate([[0], np.flatnonzero(chave[1:] != chave[:-1]) + 1, [len(chave)]]).tolist()
+    meses, anos = {}, {}
+    for inicio, fim in zip(bordas[:-1], bordas[1:]):
+        ano, mes = divmod(int(chave[inicio]), 12)
+        meses[(ano, mes + 1)] = (inicio, fim)
+        anos[ano] = (anos.get(ano, (inicio, fim))[0], fim)
+    return meses, anos
+
+def inicio_periodos(datas, granularidade):
+    dias = datas.astype('datetime64[D]')
+    if granularidade == 'dia':
+        return dias
+    if granularidade == 'semana':
+        # 1970-01-01 foi uma quinta-feira; as semanas começam na segunda.
+        return ((dias.astype(np.int64) + 3) // 7 * 7 - 3).astype('datetime64[D]')
+    if granularidade == 'ano':
+        return dias.astype('datetime64[Y]').astype('datetime64[D]')
+    meses = dias.astype('datetime64[M]').astype(np.int64)
+    if granularidade == 'trimestre':
+        meses = meses - meses % 3
+    return meses.astype('datetime64[M]').astype('datetime64[D]')
+
+def periodos(indice, granularidade):
+    # Calculado uma vez por estado e granularidade: o início de cada período
+    # e as posições onde ele começa no df, com o fim do df no final.
+    if granularidade not in indice['periodos']:
+        inicios = inicio_periodos(indice['datas'], granularidade)
+        cortes = np.flatnonzero(inicios[1:] != inicios[:-1]) + 1
+        indice['periodos'][granularidade] = (
+            inicios[np.concatenate([[0], cortes])] if len(inicios) else inicios,
+            np.concatenate([[0], cortes, [len(inicios)]])
+        )
+    return indice['periodos'][granularidade]
+
+def intervalo_linhas(indice, ano, inicio=None, fim=None, mes=None):
+    datas = indice['datas']
+    i = 0 if inicio is None else int(np.searchsorted(datas, inicio.astype(datas.dtype)))
+    j = len(datas) if fim is None else int(np.searchsorted(datas, (fim + 1).astype(datas.dtype)))
+    if ano != 'todos':
+        limites = indice['anos'].get(ano, (0, 0)) if mes is None else indice['meses'].get((ano, mes), (0, 0))
+        i, j = max(i, limites[0]), min(j, limites[1])
+    return i, max(i, j)
+
+def somar_periodos(indice, i, j, granularidade):
+    inicios, bordas = periodos(indice, granularidade)
+    if i >= j:
+        return inicios[:0], {coluna: np.zeros(0, dtype=np.int64) for coluna in COLUNAS_VALORES}
+    primeiro = int(np.searchsorted(bordas, i, side='right')) - 1
+    ultimo = int(np.searchsorted(bordas, j))
+    cortes = np.clip(bordas[primeiro:ultimo + 1], i, j)
+    return inicios[primeiro:ultimo], {coluna: np.diff(indice[coluna][cortes]) for coluna in COLUNAS_VALORES}
+
+def ler_data(valor):
+    return np.datetime64(str(valor)[:10], 'D') if valor else None
+
+def descrever_periodo(inicio, fim):
+    formatar = lambda data: pd.Timestamp(data).strftime('%d/%m/%Y')
+    if inicio is not None and fim is not None:
+        return f"{formatar(inicio)} a {formatar(fim)}"
+    return f"desde {formatar(inicio)}" if inicio is not None else f"até {formatar(fim)}"
+
+@etapas.cronometrar('periodo')
+def obter_visao_periodo(ano_selecionado, inicio, fim, granularidade, atual=None, mes=None):
+    indice = (estado if atual is None else atual)['indice']
+    i, j = intervalo_linhas(indice, ano_selecionado, inicio, fim, mes)
+    totais = {coluna: (int(indice[coluna][j]) - int(indice[coluna][i])) / 100 for coluna in COLUNAS_VALORES}
+
+    x, somas = somar_periodos(indice, i, j, granularidade)
+    linhas = pd.DataFrame({'data': x.astype('datetime64[us]'), **somas})
+    if ano_selecionado == 'todos':
+        x_anual, somas_anuais = somar_periodos(indice, i, j, 'ano')
+        x_anual = x_anual.astype('datetime64[Y]').astype(np.int64) + 1970
+        titulo, titulo_anual = "Todos os Anos", 'Comparativo por Ano'
+    else:
+        x_anual, somas_anuais = somar_periodos(indice, i, j, 'mes')
+        x_anual = ABREVIACOES_MESES[x_anual.astype('datetime64[M]').astype(np.int64) % 12]
+        titulo, titulo_anual = f"Ano {ano_selecionado}", f'Comparativo Mensal - {ano_selecionado}'
+    if mes is not None:
+        titulo = f"{MESES[mes - 1]} de {ano_selecionado}"
+    if inicio is not None or fim is not None:
+        titulo = f"{titulo} ({descrever_periodo(inicio, fim)})"
+        titulo_anual = f"{titulo_anual} ({descrever_periodo(inicio, fim)})"
+
+    return {
+        'linhas': linhas,
+        'anual': pd.DataFrame({'x': x_anual, **{coluna: para_reais(somas) for coluna, somas in somas_anuais.items()}}),
+        'granularidade': granularidade,
+        'titulo_periodo': titulo,
+        'titulo_anual': titulo_anual,
+        **totais,
+        'margem': (totais['lucro'] / totais['receita'] * 100) if totais['receita'] > 0 else 0
+    }
+
+MAX_PONTOS_GRAFICO = int(os.environ.get('DASHBOARD_MAX_PONTOS', 2000))
+LIMIAR_WEBGL = int(os.environ.get('DASHBOARD_LIMIAR_WEBGL', 5000))
+METODO_AMOSTRAGEM = os.environ.get('DASHBOARD_AMOSTRAGEM', 'lttb')
+PRECOMPRIMIR_PAGINA_INICIAL = os.environ.get('DASHBOARD_PRECOMPRIMIR', '1') != '0'
+MODO_CLIENTE = os.environ.get('DASHBOARD_MODO_CLIENTE') == '1'
+DIRETORIO_DADOS = os.environ.get('DASHBOARD_DIR_DADOS')
+INTERVALO_RECARGA = float(os.environ.get('DASHBOARD_INTERVALO_RECARGA', 5))
+ARMAZENAMENTO = os.environ.get('DASHBOARD_ARMAZENAMENTO', 'memoria')
+OFICINA = os.environ.get('DASHBOARD_OFICINA', 'principal')
+DIRETORIO_COMPARTILHADO = os.environ.get('DASHBOARD_MEMORIA_COMPARTILHADA')
+PUBLICADOR = os.environ.get('DASHBOARD_PUBLICADOR') == '1'
+TRABALHADOR_COMPARTILHADO = bool(DIRETORIO_COMPARTILHADO) and not PUBLICADOR
+LIMITE_LENTO_MS = os.environ.get('DASHBOARD_LOG_LENTO_MS')
+AMOSTRA_PERFIL = float(os.environ.get('DASHBOARD_AMOSTRA_PERFIL', 0.1))
+PRECARREGADO = os.environ.get('DASHBOARD_PRECARREGAR') == '1' and not PUBLICADOR
+# Definido pelo gunicorn.conf.py: o monitor de dados só começa depois do
+# aquecimento do worker.
+MONITOR_PELO_SERVIDOR = os.environ.get('DASHBOARD_MONITOR_PELO_SERVIDOR') == '1' and not PUBLICADOR
+LINHAS_POR_BLOCO_EXPORTACAO = int(os.environ.get('DASHBOARD_EXPORTACAO_BLOCO', 50_000))
+LIMITE_EXPORTACAO_DIRETA = int(os.environ.get('DASHBOARD_EXPORTACAO_DIRETA', 100_000))
+ORCAMENTO_OFICINAS = int(float(os.environ.get('DASHBOARD_MEMORIA_OFICINAS_MB', 512)) * 1024 * 1024)
+TAMANHO_CACHE_OFICINA = int(os.environ.get('DASHBOARD_CACHE_OFICINA', 16))
+# 0 desliga o aquecimento das saídas, 1 calcula no próprio processo e mais
+# que isso usa um pool de processos.
+AQUECER_PROCESSOS = int(os.environ.get('DASHBOARD_AQUECER_PROCESSOS', os.cpu_count() or 1))
+AQUECER_OFICINAS = [nome for nome in os.environ.get('DASHBOARD_AQUECER_OFICINAS', '').split(',') if nome]
+# Intervalos no formato inicio:fim (datas ISO, um dos lados pode ficar vazio).
+AQUECER_PERIODOS = [periodo.split(':') for periodo in os.environ.get('DASHBOARD_AQUECER_PERIODOS', '').split(',') if periodo]
+
+# Gráficos por período que somam mais linhas que isso são calculados numa
+# tarefa em segundo plano, sem prender a thread do worker.
+LINHAS_TAREFA = int(os.environ.get('DASHBOARD_TAREFA_LINHAS', 2_000_000))
+DIRETORIO_TAREFAS = os.environ.get('DASHBOARD_DIR_TAREFAS', os.path.join(tempfile.gettempdir(), 'dashboard-tarefas'))
+TAREFAS_PROCESSOS = int(os.environ.get('DASHBOARD_TAREFAS_PROCESSOS', 2))
+LIMITE_TAREFA_S = float(os.environ.get('DASHBOARD_TAREFA_LIMITE_S', 300))
+EXPIRAR_TAREFA_S = float(os.environ.get('DASHBOARD_TAREFA_EXPIRAR_S', 300))
+
+cache_dashboard = CacheLRU(int(os.environ.get('DASHBOARD_CACHE_TAMANHO', 64)))
+cache_respostas = CacheLRU(int(os.environ.get('DASHBOARD_CACHE_RESPOSTAS', 256)))
+cache_estaticos = CacheLRU(64)
+# Exportações grandes são produzidas nessas threads; o worker da requisição
+# só repassa os blocos prontos ao cliente.
+executor_exportacao = ThreadPoolExecutor(int(os.environ.get('DASHBOARD_EXPORTACOES', 2)), thread_name_prefix='exportacao')
+fila_tarefas = FilaTarefas(DIRETORIO_TAREFAS, TAREFAS_PROCESSOS, LIMITE_TAREFA_S, EXPIRAR_TAREFA_S)
+perfis_lentos = PerfisLentos(float(LIMITE_LENTO_MS) / 1000, AMOSTRA_PERFIL) if LIMITE_LENTO_MS else None
+
+@etapas.cronometrar('analises')
+def construir_analises(cubo, anteriores=None, anos_afetados=None):
+    # Um ano depende só dele e do anterior (médias de até 12 meses e
+    # crescimento sobre o mesmo mês do ano anterior); os demais são reusados.
+    anos = sorted(chave for chave in cubo if chave != 'todos')
+    recalcular = anos
+    if anteriores is not None and anos_afetados is not None:
+        recalcular = [ano for ano in anos if ano in anos_afetados or ano - 1 in anos_afetados or ano not in anteriores]
+    analises = {ano: anteriores[ano] for ano in anos if ano not in recalcular}
+    if recalcular:
+        contexto = [ano for ano in anos if ano >= recalcular[0] - 1]
+        calculadas = calcular_analises(pd.concat([cubo[ano]['anual'] for ano in contexto]))
+        posicoes = np.searchsorted(calculadas['ano'].to_numpy(), contexto + [contexto[-1] + 1])
+        for ano, inicio, fim in zip(contexto, posicoes[:-1], posicoes[1:]):
+            if ano in recalcular:
+                analises[ano] = calculadas.iloc[inicio:fim].reset_index(drop=True)
+    partes = [analises[ano] for ano in anos]
+    analises['todos'] = pd.concat(partes, ignore_index=True) if partes else \
+        calcular_analises(pd.DataFrame(columns=['ano', 'mes_num', *COLUNAS_VALORES]))
+    return analises
+
+def criar_estado(dados, df, cubo, versao, atualizado_em=None, anterior=None, anos_afetados=None, acumulados=None):
+    return {
+        'dados': dados,
+        'df': df,
+        'cubo': cubo,
+        'analises': construir_analises(cubo, anterior and anterior['analises'], anos_afetados),
+        'versao': versao,
+        'indice': indexar_datas(df, acumulados),
+        'atualizado_em': atualizado_em or datetime.now(timezone.utc).replace(microsecond=0)
+    }
+
+def arrays_compartilhados(atual):
+    df_atual, cubo_atual = atual['df'], atual['cubo']
+    anos = sorted(chave for chave in cubo_atual if chave != 'todos')
+    mensal = pd.concat([cubo_atual[ano]['anual'] for ano in anos]) if anos else agregar_colunas(df_atual)['por_ano_mes']
+    arrays = {
+        'linhas/data': df_atual['data'].to_numpy().astype('datetime64[us]').view(np.int64),
+        'linhas/ano': df_atual['ano'].to_numpy(),
+        'linhas/mes': df_atual['mes'].cat.codes.to_numpy(),
+        'linhas/mes_num': df_atual['mes_num'].to_numpy(),
+        'linhas/mes_ano': df_atual['mes_ano'].cat.codes.to_numpy(),
+        'total': np.array([cubo_atual['todos'][coluna] for coluna in COLUNAS_VALORES]),
+        'por_ano/ano': np.array(anos, dtype=np.int16),
+        'por_ano_mes/ano': mensal['ano'].to_numpy(np.int16),
+        'por_ano_mes/mes_num': mensal['mes_num'].to_numpy(np.int8)
+    }
+    for coluna in COLUNAS_VALORES:
+        arrays[f'linhas/{coluna}'] = df_atual[coluna].to_numpy()
+        arrays[f'acumulado/{coluna}'] = atual['indice'][coluna]
+        arrays[f'por_ano/{coluna}'] = np.array([cubo_atual[ano][coluna] for ano in anos], dtype=np.float64)
+        arrays[f'por_ano_mes/{coluna}'] = mensal[coluna].to_numpy(np.float64)
+    return arrays
+
+def publicar_compartilhado(atual, anos_afetados=None):
+    compartilhado.publicar(DIRETORIO_COMPARTILHADO, atual['versao'], arrays_compartilhados(atual), {
+        'rotulos_mes_ano': [str(rotulo) for rotulo in atual['df']['mes_ano'].cat.categories],
+        'anos_afetados': None if anos_afetados is None else sorted(anos_afetados),
+        'atualizado_em': atual['atualizado_em'].isoformat()
+    })
+
+def estado_compartilhado(versao, arrays, meta, anterior=None):
+    # As colunas numéricas são visões somente leitura do arquivo publicado;
+    # cada trabalhador só monta as categorias e o texto da tabela.
+    novo_df = pd.DataFrame({
+        'data': arrays['linhas/data'].view('datetime64[us]'),
+        'ano': arrays['linhas/ano'],
+        'mes': pd.Categorical.from_codes(arrays['linhas/mes'], categories=MESES),
+        'mes_num': arrays['linhas/mes_num'],
+        'mes_ano': pd.Categorical.from_codes(arrays['linhas/mes_ano'], categories=meta['rotulos_mes_ano']),
+        **{coluna: arrays[f'linhas/{coluna}'] for coluna in COLUNAS_VALORES}
+    }, copy=False)
+    agregados = {
+        'total': pd.Series(arrays['total'], index=COLUNAS_VALORES),
+        'por_ano': pd.DataFrame(
+            {coluna: arrays[f'por_ano/{coluna}'] for coluna in COLUNAS_VALORES},
+            index=pd.Index(arrays['por_ano/ano'], name='ano'), copy=False
+        ),
+        'por_ano_mes': pd.DataFrame({
+            'ano': arrays['por_ano_mes/ano'],
+            'mes_num': arrays['por_ano_mes/mes_num'],
+            **{coluna: arrays[f'por_ano_mes/{coluna}'] for coluna in COLUNAS_VALORES}
+        }, copy=False)
+    }
+    incremental = anterior is not None and meta['anos_afetados'] is not None and versao == anterior['versao'] + 1
+    novo_cubo = construir_cubo(
+        novo_df,
+        anterior['cubo'] if incremental else None,
+        meta['anos_afetados'] if incremental else (),
+        agregados
+    )
+    # Trabalhadores não aplicam meses: quem grava e publica é o publicador.
+    return criar_estado(
+        None, novo_df, novo_cubo, versao, datetime.fromisoformat(meta['atualizado_em']),
+        anterior if incremental else None, set(meta['anos_afetados']) if incremental else None,
+        {coluna: arrays[f'acumulado/{coluna}'] for coluna in COLUNAS_VALORES}
+    )
+
+# O estado é trocado inteiro, nunca alterado no lugar: quem leu `estado` no
+# começo de uma requisição continua vendo dados, cubo e versão coerentes.
+armazenamento = abrir_armazenamento(ARMAZENAMENTO, {OFICINA: dados_oficina_json})
+if TRABALHADOR_COMPARTILHADO and compartilhado.versao_publicada(DIRETORIO_COMPARTILHADO) is not None:
+    estado = estado_compartilhado(*compartilhado.anexar(DIRETORIO_COMPARTILHADO))
+else:
+    if DIRETORIO_DADOS:
+        armazenamento.gravar(OFICINA, carregar_diretorio(DIRETORIO_DADOS))
+    df = colunas_para_dataframe(**armazenamento.colunas(OFICINA))
+    cubo = construir_cubo(df, agregados=armazenamento.agregados(OFICINA))
+    # Um trabalhador que subiu antes da primeira publicação fica na versão 0
+    # para anexar a primeira versão publicada.
+    versao_inicial = 0 if TRABALHADOR_COMPARTILHADO else 1
+    if PUBLICADOR:
+        versao_inicial = (compartilhado.versao_publicada(DIRETORIO_COMPARTILHADO) or 0) + 1
+    estado = criar_estado(armazenamento.ler(OFICINA), df, cubo, versao_inicial)
+    if PUBLICADOR:
+        publicar_compartilhado(estado)
+df, cubo = estado['df'], estado['cubo']
+trava_estado = threading.Lock()
+pagina_inicial = None
+
+def trocar_estado(novo_estado):
+    global estado, df, cubo
+    estado = novo_estado
+    df, cubo = novo_estado['df'], novo_estado['cubo']
+    cache_dashboard.invalidar()
+    cache_respostas.invalidar()
+    memoria_oficinas.definir(medir_memoria(novo_estado), OFICINA)
+
+def publicar_estado(dados, novo_df, novo_cubo, anos_afetados=None):
+    trocar_estado(criar_estado(dados, novo_df, novo_cubo, estado['versao'] + 1, anterior=estado, anos_afetados=anos_afetados))
+    if PUBLICADOR:
+        publicar_compartilhado(estado, anos_afetados)
+
+def recarregar_dados(dados_json):
+    with trava_estado:
+        armazenamento.gravar(OFICINA, dados_json, substituir=True)
+        novo_df = colunas_para_dataframe(**armazenamento.colunas(OFICINA))
+        publicar_estado(armazenamento.ler(OFICINA), novo_df, construir_cubo(novo_df, agregados=armazenamento.agregados(OFICINA)))
+
+def aplicar_meses(dados_json):
+    with trava_estado:
+        atual = estado
+        alterados = meses_alterados(atual['dados'], dados_json)
+        if not alterados:
+            return False
+        armazenamento.gravar(OFICINA, alterados)
+        novas_linhas = json_para_dataframe(alterados)
+        novo_df = mesclar_linhas(atual['df'], novas_linhas)
+        anos_afetados = set(novas_linhas['ano'].astype(int).tolist())
+        novo_cubo = construir_cubo(novo_df, atual['cubo'], anos_afetados, armazenamento.agregados(OFICINA, anos_afetados))
+        publicar_estado(mesclar_dados(atual['dados'], alterados), novo_df, novo_cubo, anos_afetados)
+        return True
+
+def sincronizar_compartilhado(versao):
+    if versao is None or versao == estado['versao']:
+        return False
+    with trava_estado:
+        trocar_estado(estado_compartilhado(*compartilhado.anexar(DIRETORIO_COMPARTILHADO), estado))
+        return True
+
+monitor_dados = None
+
+def reaquecendo(recarregar):
+    # Depois de uma recarga o cache de saídas está vazio; ele é refeito ali
+    # mesmo, na thread do monitor. A verificação inicial, feita ainda durante
+    # o import, fica de fora: o aquecimento da inicialização cobre esse caso.
+    # O publicador não atende requisições e não tem o que aquecer.
+    def recarregar_e_aquecer(*args):
+        alterado = recarregar(*args)
+        if alterado and not PUBLICADOR and monitor_dados is not None and AQUECER_PROCESSOS:
+            aquecer_saidas(1, ())
+        return alterado
+    return recarregar_e_aquecer
+
+def iniciar_monitor():
+    global monitor_dados
+    if monitor_dados is not None:
+        return monitor_dados
+    if TRABALHADOR_COMPARTILHADO:
+        sincronizar_compartilhado(compartilhado.versao_publicada(DIRETORIO_COMPARTILHADO))
+        monitor_dados = compartilhado.MonitorVersao(
+            DIRETORIO_COMPARTILHADO, reaquecendo(sincronizar_compartilhado), INTERVALO_RECARGA
+        ).iniciar()
+    elif DIRETORIO_DADOS:
+        monitor_dados = MonitorDiretorio(DIRETORIO_DADOS, reaquecendo(aplicar_meses), INTERVALO_RECARGA).iniciar()
+    return monitor_dados
+
+# As demais oficinas são carregadas do armazenamento na primeira visita e
+# removidas da memória, as menos usadas primeiro, quando passam do orçamento.
+# Cada uma tem seu próprio estado e cache de saídas; a oficina padrão fica
+# sempre carregada e é a única recarregada do diretório de dados.
+versoes_oficinas = itertools.count(1)
+
+def carregar_oficina(oficina):
+    with etapas.medir('carregar_oficina'):
+        df_oficina = colunas_para_dataframe(**armazenamento.colunas(oficina))
+        cubo_oficina = construir_cubo(df_oficina, agregados=armazenamento.agregados(oficina))
+        estado_oficina = criar_estado(None, df_oficina, cubo_oficina, next(versoes_oficinas))
+        # Os dados de uma oficina não mudam depois da carga e são medidos uma
+        # vez; os caches de saídas e de respostas comprimidas são somados a
+        # eles conforme enchem.
+        return (
+            estado_oficina,
+            CacheLRU(TAMANHO_CACHE_OFICINA, medir=medir_memoria),
+            CacheLRU(TAMANHO_CACHE_OFICINA, medir=medir_memoria),
+            medir_memoria(estado_oficina)
+        )
+
+oficinas = GerenciadorOficinas(
+    carregar_oficina,
+    lambda carregada: carregada[3] + carregada[1].bytes + carregada[2].bytes,
+    ORCAMENTO_OFICINAS,
+    ao_medir=lambda oficina, tamanho: memoria_oficinas.definir(tamanho, oficina),
+    ao_remover=memoria_oficinas.remover
+)
+executor_oficinas = ThreadPoolExecutor(2, thread_name_prefix='oficinas')
+memoria_oficinas.definir(medir_memoria(estado), OFICINA)
+
+def oficina_da_url(pathname):
+    partes = (pathname or '').strip('/').split('/')
+    if len(partes) >= 2 and partes[0] == 'dashboard' and partes[1]:
+        return partes[1]
+    return OFICINA
+
+def existe_oficina(oficina):
+    return oficina == OFICINA or armazenamento.existe(oficina)
+
+def contexto_oficina(oficina):
+    if oficina == OFICINA:
+        return estado, cache_dashboard
+    carregada = oficinas.carregada(oficina)
+    if carregada is not None:
+        return carregada[:2]
+    # Os callbacks aceitam qualquer pathname; só oficinas do armazenamento
+    # são carregadas, medidas e ganham série nas métricas.
+    if not armazenamento.existe(oficina):
+        raise PreventUpdate
+    return oficinas.obter(oficina)[:2]
+
+# Com preload_app o gunicorn importa o app no master antes do fork; threads
+# não sobrevivem ao fork, então cada worker inicia o seu monitor no post_fork.
+# Sem preload o worker inicia o monitor depois de se aquecer, porque o
+# aquecimento cria processos por fork.
+if not PRECARREGADO and not MONITOR_PELO_SERVIDOR:
+    iniciar_monitor()
 
 server = Flask(__name__)
 app = dash.Dash(__name__, server=server, url_base_pathname='/dashboard/')
 
+def callback_servidor(*args, **kwargs):
+    # No modo cliente essas saídas são calculadas no navegador.
+    if MODO_CLIENTE:
+        return lambda funcao: funcao
+    return app.callback(*args, **kwargs)
+
 config_grafico = {
     'displayModeBar': False,
     'staticPlot': False,
@@ -92,6 +818,8 @@ config_grafico = {
     'modeBarButtonsToRemove': ['pan2d', 'select2d', 'lasso2d', 'zoom2d', 'zoomIn2d', 'zoomOut2d', 'autoScale2d', 'resetScale2d']
 }
 
+config_grafico_principal = {**config_grafico, 'doubleClick': 'reset'}
+
 cores = {
     'background': '#fafafa',
     'surface': '#ffffff',
@@ -103,6 +831,279 @@ cores = {
     'border': '#e5e7eb'
 }
 
+ESTILO_PROGRESSO = {'fontSize': '0.875rem', 'color': cores['muted'], 'marginBottom': '8px'}
+ESTILO_PROGRESSO_OCULTO = {**ESTILO_PROGRESSO, 'display': 'none'}
+
+def figura_principal_base():
+    fig_principal = go.Figure()
+    
+    fig_principal.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines+markers',
+        name='Receitas',
+        line=dict(color=cores['success'], width=2),
+        marker=dict(size=6, color=cores['success']),
+        hovertemplate='<b>Receitas</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    
+    fig_principal.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines+markers',
+        name='Despesas',
+        line=dict(color=cores['secondary'], width=2),
+        marker=dict(size=6, color=cores['secondary']),
+        hovertemplate='<b>Despesas</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    
+    fig_principal.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines+markers',
+        name='Lucro',
+        line=dict(color=cores['primary'], width=2),
+        marker=dict(size=6, color=cores['primary']),
+        hovertemplate='<b>Lucro</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    
+    fig_principal.update_layout(
+        title='Evolução Mensal',
+        title_font_size=16,
+        title_font_color=cores['text'],
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font_color=cores['text'],
+        font_family='-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif',
+        margin=dict(l=20, r=20, t=40, b=20),
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="center",
+            x=0.5,
+            bgcolor='rgba(0,0,0,0)',
+            borderwidth=0
+        ),
+        xaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='#f3f4f6',
+            showline=False,
+            zeroline=False
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='#f3f4f6',
+            showline=False,
+            zeroline=False,
+            tickformat='$,.0f'
+        ),
+        hovermode='x unified'
+    )
+    
+    return fig_principal
+
+def figura_anual_base():
+    fig_anual = go.Figure()
+    
+    fig_anual.add_trace(go.Bar(
+        name='Receitas',
+        x=[],
+        y=[],
+        marker_color=cores['success'],
+        hovertemplate='<b>Receitas</b><br>%{x}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    fig_anual.add_trace(go.Bar(
+        name='Despesas',
+        x=[],
+        y=[],
+        marker_color=cores['secondary'],
+        hovertemplate='<b>Despesas</b><br>%{x}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    fig_anual.add_trace(go.Bar(
+        name='Lucro',
+        x=[],
+        y=[],
+        marker_color=cores['primary'],
+        hovertemplate='<b>Lucro</b><br>%{x}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    
+    fig_anual.update_layout(
+        title='Comparativo Anual',
+        title_font_size=16,
+        title_font_color=cores['text'],
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font_color=cores['text'],
+        font_family='-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif',
+        margin=dict(l=20, r=20, t=40, b=20),
+        barmode='group',
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="center",
+            x=0.5,
+            bgcolor='rgba(0,0,0,0)',
+            borderwidth=0
+        ),
+        xaxis=dict(
+            showgrid=False,
+            showline=False,
+            zeroline=False,
+            type='category'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='#f3f4f6',
+            showline=False,
+            zeroline=False,
+            tickformat='$,.0f'
+        )
+    )
+    
+    return fig_anual
+
+def layout_analises(titulo, formato_y, formato_y2):
+    return dict(
+        title=titulo,
+        title_font_size=16,
+        title_font_color=cores['text'],
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font_color=cores['text'],
+        font_family='-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif',
+        margin=dict(l=20, r=20, t=40, b=20),
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="center",
+            x=0.5,
+            bgcolor='rgba(0,0,0,0)',
+            borderwidth=0
+        ),
+        xaxis=dict(
+            showgrid=False,
+            showline=False,
+            zeroline=False,
+            tickformat='%b/%Y'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='#f3f4f6',
+            showline=False,
+            zeroline=False,
+            **formato_y
+        ),
+        yaxis2=dict(
+            overlaying='y',
+            side='right',
+            showgrid=False,
+            showline=False,
+            zeroline=False,
+            **formato_y2
+        ),
+        hovermode='x unified'
+    )
+
+def figura_tendencia_base():
+    fig_tendencia = go.Figure()
+    
+    fig_tendencia.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines',
+        name='Lucro',
+        line=dict(color=cores['muted'], width=1),
+        hovertemplate='<b>Lucro</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    fig_tendencia.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines',
+        name='Média móvel 3 meses',
+        line=dict(color=cores['primary'], width=2),
+        hovertemplate='<b>Média 3 meses</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    fig_tendencia.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines',
+        name='Média móvel 12 meses',
+        line=dict(color=cores['success'], width=2),
+        hovertemplate='<b>Média 12 meses</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    fig_tendencia.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines',
+        name='Margem 12 meses',
+        yaxis='y2',
+        line=dict(color=cores['secondary'], width=2, dash='dot'),
+        hovertemplate='<b>Margem 12 meses</b><br>%{x|%b/%Y}<br>%{y:.1f}%<extra></extra>'
+    ))
+    
+    fig_tendencia.update_layout(**layout_analises(
+        'Médias Móveis do Lucro', {'tickformat': '$,.0f'}, {'ticksuffix': '%'}
+    ))
+    
+    return fig_tendencia
+
+def figura_crescimento_base():
+    fig_crescimento = go.Figure()
+    
+    fig_crescimento.add_trace(go.Bar(
+        name='Crescimento da receita',
+        x=[],
+        y=[],
+        marker_color=cores['success'],
+        hovertemplate='<b>Receita</b><br>%{x|%b/%Y}<br>%{y:+.1f}% sobre o ano anterior<extra></extra>'
+    ))
+    fig_crescimento.add_trace(go.Bar(
+        name='Crescimento do lucro',
+        x=[],
+        y=[],
+        marker_color=cores['primary'],
+        hovertemplate='<b>Lucro</b><br>%{x|%b/%Y}<br>%{y:+.1f}% sobre o ano anterior<extra></extra>'
+    ))
+    fig_crescimento.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines',
+        name='Receita acumulada no ano',
+        yaxis='y2',
+        line=dict(color=cores['success'], width=2, dash='dot'),
+        hovertemplate='<b>Receita no ano</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    fig_crescimento.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines',
+        name='Lucro acumulado no ano',
+        yaxis='y2',
+        line=dict(color=cores['primary'], width=2, dash='dot'),
+        hovertemplate='<b>Lucro no ano</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
+    ))
+    
+    fig_crescimento.update_layout(**layout_analises(
+        'Crescimento Anual e Acumulado no Ano', {'ticksuffix': '%'}, {'tickformat': '$,.0f'}
+    ))
+    fig_crescimento.update_layout(barmode='group')
+    
+    return fig_crescimento
+
+def opcoes_ano(cubo):
+    return [{'label': 'Todos os Anos', 'value': 'todos'}] + \
+           [{'label': str(ano), 'value': ano} for ano in sorted(chave for chave in cubo if chave != 'todos')]
+
 app.layout = html.Div(
     style={
         'backgroundColor': cores['background'],
@@ -113,6 +1114,9 @@ app.layout = html.Div(
         'margin': '0'
     },
     children=[
+        dcc.Location(id='url', refresh=False),
+        dcc.Store(id='selecao-anual'),
+        *([dcc.Store(id='dados-agregados')] if MODO_CLIENTE else [dcc.Store(id='pedido-grafico-principal')]),
         html.Div(
             style={
                 'backgroundColor': cores['surface'],
@@ -174,14 +1178,72 @@ app.layout = html.Div(
                         ),
                         dcc.Dropdown(
                             id='filtro-ano',
-                            options=[{'label': 'Todos os Anos', 'value': 'todos'}] + 
-                                    [{'label': str(ano), 'value': ano} for ano in sorted(df['ano'].unique())],
+                            options=opcoes_ano(cubo),
                             value='todos',
                             style={
                                 'width': '160px',
                                 'fontSize': '0.875rem'
                             },
                             clearable=False
+                        ),
+                        # No modo cliente as saídas vêm só dos agregados por
+                        # ano e mês; o período livre depende do servidor.
+                        *([] if MODO_CLIENTE else [
+                            html.Label(
+                                'Período:',
+                                style={
+                                    'fontWeight': '500',
+                                    'color': cores['text'],
+                                    'fontSize': '0.875rem'
+                                }
+                            ),
+                            dcc.DatePickerRange(
+                                id='filtro-periodo',
+                                display_format='DD/MM/YYYY',
+                                first_day_of_week=1,
+                                start_date_placeholder_text='Início',
+                                end_date_placeholder_text='Fim',
+                                clearable=True
+                            ),
+                            html.Label(
+                                'Agrupar por:',
+                                style={
+                                    'fontWeight': '500',
+                                    'color': cores['text'],
+                                    'fontSize': '0.875rem'
+                                }
+                            ),
+                            dcc.Dropdown(
+                                id='filtro-granularidade',
+                                options=[{'label': rotulo, 'value': valor} for valor, (rotulo, _, _) in GRANULARIDADES.items()],
+                                value='mes',
+                                style={
+                                    'width': '140px',
+                                    'fontSize': '0.875rem'
+                                },
+                                clearable=False
+                            )
+                        ]),
+                        html.Div(
+                            style={'marginLeft': 'auto', 'display': 'flex', 'gap': '8px'},
+                            children=[
+                                html.A(
+                                    f'Exportar {formato.upper()}',
+                                    id=f'exportar-{formato}',
+                                    href=f'/exportar?ano=todos&formato={formato}',
+                                    download='',
+                                    style={
+                                        'padding': '8px 16px',
+                                        'borderRadius': '6px',
+                                        'border': f'1px solid {cores["border"]}',
+                                        'color': cores['primary'],
+                                        'fontSize': '0.875rem',
+                                        'fontWeight': '500',
+                                        'textDecoration': 'none'
+                                    }
+                                )
+                                for formato in ('csv', 'xlsx')
+                            ]
                         )
                     ]
                 ),
@@ -207,9 +1269,11 @@ app.layout = html.Div(
                     children=[
                         html.H3('Evolução Mensal', 
                                 style={'margin': '0 0 24px 0', 'fontSize': '1.125rem', 'fontWeight': '600', 'color': cores['text']}),
+                        html.Div(id='progresso-grafico-principal', style=ESTILO_PROGRESSO_OCULTO),
                         dcc.Graph(
                             id='grafico-principal',
-                            config=config_grafico,
+                            figure=figura_principal_base(),
+                            config=config_grafico_principal,
                             style={'height': '400px'}
                         )
                     ]
@@ -226,8 +1290,39 @@ app.layout = html.Div(
                     children=[
                         html.H3('Comparativo Anual', 
                                 style={'margin': '0 0 24px 0', 'fontSize': '1.125rem', 'fontWeight': '600', 'color': cores['text']}),
+                        *([] if MODO_CLIENTE else [
+                            html.P('Clique numa barra para filtrar o resto do painel; clique de novo para voltar.',
+                                   style={'margin': '-16px 0 16px 0', 'fontSize': '0.875rem', 'color': cores['muted']})
+                        ]),
                         dcc.Graph(
                             id='grafico-anual',
+                            figure=figura_anual_base(),
+                            config=config_grafico,
+                            style={'height': '350px'}
+                        )
+                    ]
+                ),
+                
+                html.Div(
+                    style={
+                        'backgroundColor': cores['surface'],
+                        'padding': '24px',
+                        'borderRadius': '8px',
+                        'border': f'1px solid {cores["border"]}',
+                        'marginBottom': '24px'
+                    },
+                    children=[
+                        html.H3('Análises', 
+                                style={'margin': '0 0 24px 0', 'fontSize': '1.125rem', 'fontWeight': '600', 'color': cores['text']}),
+                        dcc.Graph(
+                            id='grafico-tendencia',
+                            figure=figura_tendencia_base(),
+                            config=config_grafico,
+                            style={'height': '350px'}
+                        ),
+                        dcc.Graph(
+                            id='grafico-crescimento',
+                            figure=figura_crescimento_base(),
                             config=config_grafico,
                             style={'height': '350px'}
                         )
@@ -254,8 +1349,11 @@ app.layout = html.Div(
                                 {'name': 'Lucro', 'id': 'lucro_formatado', 'type': 'text'},
                                 {'name': 'Margem (%)', 'id': 'margem', 'type': 'numeric', 'format': {'specifier': '.1f'}}
                             ],
-                            sort_action='native',
+                            page_action='custom',
+                            page_current=0,
+                            sort_action='custom',
                             sort_mode='single',
+                            sort_by=[],
                             style_cell={
                                 'backgroundColor': cores['surface'],
                                 'color': cores['text'],
@@ -296,27 +1394,9 @@ app.layout = html.Div(
     ]
 )
 
-@app.callback(
-    [Output('cards-metricas', 'children'),
-     Output('grafico-principal', 'figure'),
-     Output('grafico-anual', 'figure'),
-     Output('tabela-simples', 'data')],
-    [Input('filtro-ano', 'value')]
-)
-def atualizar_dashboard(ano_selecionado):
-    if ano_selecionado == 'todos':
-        df_filtrado = df.copy()
-        titulo_periodo = "Todos os Anos"
-    else:
-        df_filtrado = df[df['ano'] == ano_selecionado].copy()
-        titulo_periodo = f"Ano {ano_selecionado}"
-    
-    receita_total = df_filtrado['receita'].sum()
-    despesas_total = df_filtrado['despesas'].sum()
-    lucro_total = df_filtrado['lucro'].sum()
-    margem_media = (lucro_total / receita_total * 100) if receita_total > 0 else 0
-    
-    cards = [
+@etapas.cronometrar('cards')
+def montar_cards(visao):
+    return [
         html.Div(
             style={
                 'backgroundColor': cores['surface'],
@@ -327,7 +1407,7 @@ def atualizar_dashboard(ano_selecionado):
             },
             children=[
                 html.P('Receita Total', style={'margin': '0 0 8px 0', 'fontSize': '0.875rem', 'color': cores['muted']}),
-                html.H2(formatar_real(receita_total), 
+                html.H2(formatar_real(visao['receita']), 
                         style={'margin': '0', 'fontSize': '1.5rem', 'fontWeight': '600', 'color': cores['success']})
             ]
         ),
@@ -341,7 +1421,7 @@ def atualizar_dashboard(ano_selecionado):
             },
             children=[
                 html.P('Despesas Totais', style={'margin': '0 0 8px 0', 'fontSize': '0.875rem', 'color': cores['muted']}),
-                html.H2(formatar_real(despesas_total), 
+                html.H2(formatar_real(visao['despesas']), 
                         style={'margin': '0', 'fontSize': '1.5rem', 'fontWeight': '600', 'color': cores['secondary']})
             ]
         ),
@@ -355,7 +1435,7 @@ def atualizar_dashboard(ano_selecionado):
             },
             children=[
                 html.P('Lucro Total', style={'margin': '0 0 8px 0', 'fontSize': '0.875rem', 'color': cores['muted']}),
-                html.H2(formatar_real(lucro_total), 
+                html.H2(formatar_real(visao['lucro']), 
                         style={'margin': '0', 'fontSize': '1.5rem', 'fontWeight': '600', 'color': cores['primary']})
             ]
         ),
@@ -369,175 +1449,382 @@ def atualizar_dashboard(ano_selecionado):
             },
             children=[
                 html.P('Margem Média', style={'margin': '0 0 8px 0', 'fontSize': '0.875rem', 'color': cores['muted']}),
-                html.H2(f'{margem_media:.1f}%', 
+                html.H2(f"{visao['margem']:.1f}%", 
                         style={'margin': '0', 'fontSize': '1.5rem', 'fontWeight': '600', 'color': cores['text']})
             ]
         )
     ]
+
+@etapas.cronometrar('serializacao')
+def serializar_saida(saida):
+    # to_json_plotly já usa orjson quando ele está instalado.
+    texto = to_json_plotly(saida)
+    return orjson.loads(texto) if orjson is not None else json.loads(texto)
+
+@etapas.cronometrar('grafico')
+def patch_grafico_principal(visao, intervalo=None):
+    linhas = visao['linhas']
+    if intervalo is not None:
+        inicio, fim = np.searchsorted(linhas['data'].to_numpy(), intervalo)
+        linhas = linhas.iloc[max(inicio - 1, 0):fim + 1]
     
-    fig_principal = go.Figure()
-    
-    if not df_filtrado.empty:
-        fig_principal.add_trace(go.Scatter(
-            x=df_filtrado['data'],
-            y=df_filtrado['receita'],
-            mode='lines+markers',
-            name='Receitas',
-            line=dict(color=cores['success'], width=2),
-            marker=dict(size=6, color=cores['success']),
-            hovertemplate='<b>Receitas</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
-        ))
-        
-        fig_principal.add_trace(go.Scatter(
-            x=df_filtrado['data'],
-            y=df_filtrado['despesas'],
-            mode='lines+markers',
-            name='Despesas',
-            line=dict(color=cores['secondary'], width=2),
-            marker=dict(size=6, color=cores['secondary']),
-            hovertemplate='<b>Despesas</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
-        ))
-        
-        fig_principal.add_trace(go.Scatter(
-            x=df_filtrado['data'],
-            y=df_filtrado['lucro'],
-            mode='lines+markers',
-            name='Lucro',
-            line=dict(color=cores['primary'], width=2),
-            marker=dict(size=6, color=cores['primary']),
-            hovertemplate='<b>Lucro</b><br>%{x|%b/%Y}<br>%{y:$,.2f}<extra></extra>'
-        ))
-    
-    fig_principal.update_layout(
-        title=f'Evolução Mensal - {titulo_periodo}',
-        title_font_size=16,
-        title_font_color=cores['text'],
-        paper_bgcolor='white',
-        plot_bgcolor='white',
-        font_color=cores['text'],
-        font_family='-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif',
-        margin=dict(l=20, r=20, t=40, b=20),
-        showlegend=True,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="center",
-            x=0.5,
-            bgcolor='rgba(0,0,0,0)',
-            borderwidth=0
-        ),
-        xaxis=dict(
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='#f3f4f6',
-            showline=False,
-            zeroline=False
-        ),
-        yaxis=dict(
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='#f3f4f6',
-            showline=False,
-            zeroline=False,
-            tickformat='$,.0f'
-        ),
-        hovermode='x unified'
-    )
-    
-    if ano_selecionado == 'todos':
-        df_anual = df.groupby('ano').agg({
-            'receita': 'sum',
-            'despesas': 'sum',
-            'lucro': 'sum'
-        }).reset_index()
+    _, adjetivo, formato_data = GRANULARIDADES[visao.get('granularidade', 'mes')]
+    tipo = 'scattergl' if len(linhas) > LIMIAR_WEBGL else 'scatter'
+    datas = linhas['data']
+    patch = Patch()
+    for indice, (coluna, nome) in enumerate(zip(COLUNAS_VALORES, NOMES_SERIES)):
+        with etapas.medir('amostragem'):
+            pontos = amostrar(datas.to_numpy().astype(np.int64), linhas[coluna].to_numpy(), MAX_PONTOS_GRAFICO, METODO_AMOSTRAGEM)
+        patch['data'][indice]['type'] = tipo
+        patch['data'][indice]['x'] = datas.iloc[pontos]
+        patch['data'][indice]['y'] = para_reais(linhas[coluna].to_numpy()[pontos])
+        patch['data'][indice]['hovertemplate'] = f'<b>{nome}</b><br>%{{x|{formato_data}}}<br>%{{y:$,.2f}}<extra></extra>'
+    patch['layout']['title']['text'] = f"Evolução {adjetivo} - {visao['titulo_periodo']}"
+    patch['layout']['uirevision'] = visao['titulo_periodo']
+    return patch
+
+def intervalo_visivel(relayout):
+    if 'xaxis.range[0]' in relayout:
+        limites = relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    elif 'xaxis.range' in relayout:
+        limites = relayout['xaxis.range']
     else:
-        df_anual = df_filtrado.groupby(['ano', 'mes_num', 'mes']).agg({
-            'receita': 'sum',
-            'despesas': 'sum',
-            'lucro': 'sum'
-        }).reset_index().sort_values('mes_num')
-        df_anual['x_label'] = df_anual['mes'].apply(lambda x: x[:3])
-    
-    fig_anual = go.Figure()
-    
+        return None
+    return np.array([pd.Timestamp(limite) for limite in limites], dtype='datetime64[us]')
+
+@etapas.cronometrar('grafico')
+def patch_grafico_anual(visao):
+    anual = visao['anual']
+    patch = Patch()
+    for indice, coluna in enumerate(COLUNAS_VALORES):
+        patch['data'][indice]['x'] = anual['x']
+        patch['data'][indice]['y'] = anual[coluna]
+    patch['layout']['title']['text'] = visao['titulo_anual']
+    return patch
+
+def chave_visao_periodo(ano_selecionado, inicio, fim, granularidade, atual, mes=None):
+    return ('visao-periodo', atual['versao'], ano_selecionado, inicio, fim, granularidade, mes)
+
+def visao_periodo(ano_selecionado, inicio, fim, granularidade='mes', atual=None, cache=None, mes=None):
+    atual = estado if atual is None else atual
+    return (cache_dashboard if cache is None else cache).obter(
+        chave_visao_periodo(ano_selecionado, inicio, fim, granularidade, atual, mes),
+        lambda: obter_visao_periodo(ano_selecionado, inicio, fim, granularidade, atual, mes)
+    )
+
+COLUNAS_TENDENCIA = ['lucro', 'media_movel_3', 'media_movel_12', 'margem_movel_12']
+COLUNAS_CRESCIMENTO = ['crescimento_receita', 'crescimento_lucro', 'acumulado_receita', 'acumulado_lucro']
+
+@etapas.cronometrar('grafico')
+def patch_analises(analises, colunas, titulo):
+    patch = Patch()
+    for indice, coluna in enumerate(colunas):
+        patch['data'][indice]['x'] = analises['data']
+        patch['data'][indice]['y'] = analises[coluna]
+    patch['layout']['title']['text'] = titulo
+    return patch
+
+def analises_do_ano(ano_selecionado, atual=None):
+    analises = (estado if atual is None else atual)['analises']
+    if ano_selecionado in analises:
+        return analises[ano_selecionado]
+    return analises['todos'].iloc[0:0]
+
+def aplicar_selecao(ano_selecionado, selecao):
+    # A barra clicada no gráfico anual vale no lugar do filtro de ano: um ano
+    # na visão de todos, ou um mês do ano escolhido.
+    if not selecao:
+        return ano_selecionado, None
+    return selecao['ano'], selecao.get('mes_num')
+
+@callback_servidor(
+    Output('cards-metricas', 'children'),
+    [Input('filtro-ano', 'value'),
+     Input('filtro-periodo', 'start_date'),
+     Input('filtro-periodo', 'end_date'),
+     Input('selecao-anual', 'data')],
+    State('url', 'pathname')
+)
+def atualizar_cards(ano_selecionado, inicio=None, fim=None, selecao=None, pathname=None):
+    ano_selecionado, mes = aplicar_selecao(ano_selecionado, selecao)
+    return saida_cards(ano_selecionado, ler_data(inicio), ler_data(fim), *contexto_oficina(oficina_da_url(pathname)), mes)
+
+def saida_cards(ano_selecionado, inicio, fim, atual, cache, mes=None):
+    if inicio is not None or fim is not None or mes is not None:
+        return cache.obter(
+            ('cards-metricas', atual['versao'], ano_selecionado, inicio, fim, mes),
+            lambda: serializar_saida(montar_cards(visao_periodo(ano_selecionado, inicio, fim, atual=atual, cache=cache, mes=mes)))
+        )
+    return cache.obter(
+        ('cards-metricas', atual['versao'], ano_selecionado),
+        lambda: serializar_saida(montar_cards(obter_visao(ano_selecionado, atual)))
+    )
+
+@callback_servidor(
+    Output('grafico-principal', 'figure'),
+    [Input('filtro-ano', 'value'),
+     Input('grafico-principal', 'relayoutData'),
+     Input('filtro-periodo', 'start_date'),
+     Input('filtro-periodo', 'end_date'),
+     Input('filtro-granularidade', 'value'),
+     Input('selecao-anual', 'data')],
+    State('url', 'pathname')
+)
+def atualizar_grafico_principal(ano_selecionado, relayout, inicio=None, fim=None, granularidade=None, selecao=None, pathname=None):
+    oficina = oficina_da_url(pathname)
+    atual, cache = contexto_oficina(oficina)
+    texto_inicio, texto_fim = inicio, fim
+    inicio, fim = ler_data(inicio), ler_data(fim)
+    granularidade = granularidade if granularidade in GRANULARIDADES else 'mes'
+    ano_selecionado, mes = aplicar_selecao(ano_selecionado, selecao)
+    if mes is not None and granularidade not in ('dia', 'semana'):
+        # Um mês por mês seria um ponto só.
+        granularidade = 'dia'
+    intervalo = None
+    if ctx.triggered_id == 'grafico-principal':
+        # Só um zoom no eixo x ou a volta ao zoom automático pedem outra série;
+        # redimensionar e mexer no eixo y não.
+        intervalo = intervalo_visivel(relayout) if relayout else None
+        if intervalo is None and not (relayout and relayout.get('xaxis.autorange')):
+            return no_update
+        if not em_segundo_plano(ano_selecionado, inicio, fim, granularidade, atual, cache, mes):
+            visao = visao_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, cache, mes)
+            # Zoom só busca mais detalhe quando a série inteira foi reduzida.
+            if len(visao['linhas']) <= MAX_PONTOS_GRAFICO:
+                return no_update
+            if intervalo is not None:
+                return serializar_saida(patch_grafico_principal(visao, intervalo))
+            return saida_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, cache, mes)
+
+    if em_segundo_plano(ano_selecionado, inicio, fim, granularidade, atual, cache, mes):
+        set_props('pedido-grafico-principal', {'data': {
+            'oficina': oficina, 'versao': atual['versao'], 'ano': ano_selecionado, 'mes': mes,
+            'inicio': texto_inicio, 'fim': texto_fim, 'granularidade': granularidade,
+            'intervalo': None if intervalo is None else [str(limite) for limite in intervalo]
+        }})
+        return no_update
+    return saida_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, cache, mes)
+
+def em_segundo_plano(ano_selecionado, inicio, fim, granularidade, atual, cache, mes=None):
+    # Só as visões por período saem das somas acumuladas em vez do cubo, e só
+    # elas podem demorar; já calculadas (o gráfico ou a visão, que o zoom
+    # usa), voltam direto do cache.
+    if inicio is None and fim is None and granularidade == 'mes' and mes is None:
+        return False
+    if chave_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, mes) in cache:
+        return False
+    if chave_visao_periodo(ano_selecionado, inicio, fim, granularidade, atual, mes) in cache:
+        return False
+    i, j = intervalo_linhas(atual['indice'], ano_selecionado, inicio, fim, mes)
+    return j - i >= LINHAS_TAREFA
+
+@callback_servidor(
+    Output('grafico-principal', 'figure', allow_duplicate=True),
+    Input('pedido-grafico-principal', 'data'),
+    background=True,
+    manager=fila_tarefas,
+    progress=Output('progresso-grafico-principal', 'children'),
+    progress_default="Calculando o gráfico...",
+    running=[(Output('progresso-grafico-principal', 'style'), ESTILO_PROGRESSO, ESTILO_PROGRESSO_OCULTO)],
+    cancel=[Input('filtro-ano', 'value'),
+            Input('filtro-periodo', 'start_date'),
+            Input('filtro-periodo', 'end_date'),
+            Input('filtro-granularidade', 'value'),
+            Input('selecao-anual', 'data'),
+            Input('url', 'pathname')],
+    interval=250,
+    prevent_initial_call=True
+)
+def calcular_grafico_principal(definir_progresso, pedido):
+    # Roda no processo da tarefa, que herdou os dados do worker. As saídas
+    # ficam numa coleta própria: o cache do worker não é dividido com o fork.
+    atual, _ = contexto_oficina(pedido['oficina'])
+    ano_selecionado, granularidade, mes = pedido['ano'], pedido['granularidade'], pedido['mes']
+    inicio, fim = ler_data(pedido['inicio']), ler_data(pedido['fim'])
+    coleta = ColetaSaidas()
+    definir_progresso("Calculando o gráfico: somando os períodos (1/2)...")
+    visao = visao_periodo(ano_selecionado, inicio, fim, granularidade, atual=atual, cache=coleta, mes=mes)
+    definir_progresso("Calculando o gráfico: reduzindo os pontos (2/2)...")
+    if pedido.get('intervalo') is not None:
+        # Zoom numa visão que o worker não tinha: só a faixa visível.
+        if len(visao['linhas']) <= MAX_PONTOS_GRAFICO:
+            raise PreventUpdate
+        return serializar_saida(patch_grafico_principal(visao, np.array(pedido['intervalo'], dtype='datetime64[us]')))
+    return saida_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, coleta, mes)
+
+def visao_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, cache, mes=None):
+    if inicio is not None or fim is not None or granularidade != 'mes' or mes is not None:
+        return visao_periodo(ano_selecionado, inicio, fim, granularidade, atual, cache, mes)
+    return obter_visao(ano_selecionado, atual)
+
+def chave_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, mes=None):
+    if inicio is not None or fim is not None or granularidade != 'mes' or mes is not None:
+        return ('grafico-principal', atual['versao'], ano_selecionado, inicio, fim, granularidade, mes)
+    return ('grafico-principal', atual['versao'], ano_selecionado)
+
+def saida_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, cache, mes=None):
+    chave = chave_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, mes)
+    return cache.obter(chave, lambda: serializar_saida(patch_grafico_principal(
+        visao_grafico_principal(ano_selecionado, inicio, fim, granularidade, atual, cache, mes)
+    )))
+
+@callback_servidor(
+    Output('grafico-anual', 'figure'),
+    [Input('filtro-ano', 'value'),
+     Input('filtro-periodo', 'start_date'),
+     Input('filtro-periodo', 'end_date')],
+    State('url', 'pathname')
+)
+def atualizar_grafico_anual(ano_selecionado, inicio=None, fim=None, pathname=None):
+    return saida_grafico_anual(ano_selecionado, ler_data(inicio), ler_data(fim), *contexto_oficina(oficina_da_url(pathname)))
+
+def saida_grafico_anual(ano_selecionado, inicio, fim, atual, cache):
+    if inicio is not None or fim is not None:
+        return cache.obter(
+            ('grafico-anual', atual['versao'], ano_selecionado, inicio, fim),
+            lambda: serializar_saida(patch_grafico_anual(visao_periodo(ano_selecionado, inicio, fim, atual=atual, cache=cache)))
+        )
+    return cache.obter(
+        ('grafico-anual', atual['versao'], ano_selecionado),
+        lambda: serializar_saida(patch_grafico_anual(obter_visao(ano_selecionado, atual)))
+    )
+
+@callback_servidor(
+    Output('selecao-anual', 'data'),
+    [Input('grafico-anual', 'clickData'),
+     Input('filtro-ano', 'value')],
+    State('selecao-anual', 'data'),
+    prevent_initial_call=True
+)
+def selecionar_barra_anual(clique, ano_selecionado, selecao):
+    # Trocar o ano no filtro desfaz a seleção, assim como clicar de novo na
+    # mesma barra.
+    if ctx.triggered_id != 'grafico-anual' or not clique or not clique.get('points'):
+        return None
+    x = clique['points'][0]['x']
     if ano_selecionado == 'todos':
-        x_data = df_anual['ano']
-        titulo_anual = 'Comparativo por Ano'
+        nova = {'ano': int(x)}
+    elif x in ABREVIACOES_MESES:
+        nova = {'ano': ano_selecionado, 'mes_num': ABREVIACOES_MESES.tolist().index(x) + 1}
     else:
-        x_data = df_anual['x_label']
-        titulo_anual = f'Comparativo Mensal - {ano_selecionado}'
-    
-    fig_anual.add_trace(go.Bar(
-        name='Receitas',
-        x=x_data,
-        y=df_anual['receita'],
-        marker_color=cores['success'],
-        hovertemplate='<b>Receitas</b><br>%{x}<br>%{y:$,.2f}<extra></extra>'
-    ))
-    fig_anual.add_trace(go.Bar(
-        name='Despesas',
-        x=x_data,
-        y=df_anual['despesas'],
-        marker_color=cores['secondary'],
-        hovertemplate='<b>Despesas</b><br>%{x}<br>%{y:$,.2f}<extra></extra>'
-    ))
-    fig_anual.add_trace(go.Bar(
-        name='Lucro',
-        x=x_data,
-        y=df_anual['lucro'],
-        marker_color=cores['primary'],
-        hovertemplate='<b>Lucro</b><br>%{x}<br>%{y:$,.2f}<extra></extra>'
-    ))
-    
-    fig_anual.update_layout(
-        title=titulo_anual,
-        title_font_size=16,
-        title_font_color=cores['text'],
-        paper_bgcolor='white',
-        plot_bgcolor='white',
-        font_color=cores['text'],
-        font_family='-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif',
-        margin=dict(l=20, r=20, t=40, b=20),
-        barmode='group',
-        showlegend=True,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="center",
-            x=0.5,
-            bgcolor='rgba(0,0,0,0)',
-            borderwidth=0
-        ),
-        xaxis=dict(
-            showgrid=False,
-            showline=False,
-            zeroline=False,
-            type='category'
-        ),
-        yaxis=dict(
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='#f3f4f6',
-            showline=False,
-            zeroline=False,
-            tickformat='$,.0f'
-        )
+        return no_update
+    return None if nova == selecao else nova
+
+@callback_servidor(
+    [Output('tabela-simples', 'data'),
+     Output('tabela-simples', 'page_count'),
+     Output('tabela-simples', 'page_current')],
+    [Input('filtro-ano', 'value'),
+     Input('tabela-simples', 'page_current'),
+     Input('tabela-simples', 'page_size'),
+     Input('tabela-simples', 'sort_by'),
+     Input('selecao-anual', 'data')],
+    State('url', 'pathname')
+)
+def atualizar_tabela(ano_selecionado, pagina, tamanho_pagina, ordenacao, selecao=None, pathname=None):
+    atual, cache = contexto_oficina(oficina_da_url(pathname))
+    if ctx.triggered_id in ('filtro-ano', 'selecao-anual'):
+        pagina = 0
+    ano_selecionado, mes = aplicar_selecao(ano_selecionado, selecao)
+    return paginar_tabela(visao_tabela(ano_selecionado, mes, atual, cache), pagina or 0, tamanho_pagina or 12, ordenacao)
+
+def visao_tabela(ano_selecionado, mes, atual, cache):
+    if mes is None:
+        return obter_visao(ano_selecionado, atual)
+    return cache.obter(('tabela-mes', atual['versao'], ano_selecionado, mes), lambda: fatiar_tabela(ano_selecionado, mes, atual))
+
+def fatiar_tabela(ano_selecionado, mes, atual):
+    # A tabela de todos os anos segue a ordem do df, então as linhas de um
+    # mês são a fatia dada pelo índice.
+    i, j = atual['indice']['meses'].get((ano_selecionado, mes), (0, 0))
+    linhas = atual['df'].iloc[i:j]
+    tabela = atual['cubo']['todos']['tabela'].iloc[i:j].reset_index(drop=True)
+    return {'linhas': linhas, 'tabela': tabela, 'ordens': indexar_ordens(linhas, tabela)}
+
+# O painel de análises vem sempre do servidor, também no modo cliente: os
+# agregados enviados ao navegador não trazem as séries derivadas.
+@app.callback(
+    [Output('grafico-tendencia', 'figure'),
+     Output('grafico-crescimento', 'figure')],
+    Input('filtro-ano', 'value'),
+    State('url', 'pathname')
+)
+def atualizar_analises(ano_selecionado, pathname=None):
+    return saida_analises(ano_selecionado, *contexto_oficina(oficina_da_url(pathname)))
+
+def saida_analises(ano_selecionado, atual, cache):
+    def calcular():
+        analises = analises_do_ano(ano_selecionado, atual)
+        periodo = "Todos os Anos" if ano_selecionado == 'todos' else f"Ano {ano_selecionado}"
+        return serializar_saida([
+            patch_analises(analises, COLUNAS_TENDENCIA, f'Médias Móveis do Lucro - {periodo}'),
+            patch_analises(analises, COLUNAS_CRESCIMENTO, f'Crescimento Anual e Acumulado no Ano - {periodo}')
+        ])
+    return cache.obter(('analises', atual['versao'], ano_selecionado), calcular)
+
+@app.callback(
+    Output('filtro-ano', 'options'),
+    Input('url', 'pathname')
+)
+def atualizar_opcoes_ano(pathname):
+    # Anos novos chegam com a recarga de dados sem reiniciar o servidor.
+    atual, cache = contexto_oficina(oficina_da_url(pathname))
+    return cache.obter(('opcoes-ano', atual['versao']), lambda: opcoes_ano(atual['cubo']))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='linksExportacao'),
+    [Output('exportar-csv', 'href'),
+     Output('exportar-xlsx', 'href')],
+    [Input('filtro-ano', 'value'),
+     Input('tabela-simples', 'sort_by'),
+     Input('selecao-anual', 'data')],
+    State('url', 'pathname')
+)
+
+if MODO_CLIENTE:
+    @app.callback(
+        Output('dados-agregados', 'data'),
+        Input('url', 'pathname')
     )
+    def carregar_dados_cliente(pathname):
+        atual, cache = contexto_oficina(oficina_da_url(pathname))
+        return cache.obter(('dados-agregados', atual['versao']), lambda: montar_dados_cliente(atual['df'], atual['cubo']))
     
-    df_tabela = df_filtrado.copy()
-    df_tabela['receita_formatada'] = df_tabela['receita'].apply(formatar_real)
-    df_tabela['despesas_formatada'] = df_tabela['despesas'].apply(formatar_real)
-    df_tabela['lucro_formatado'] = df_tabela['lucro'].apply(formatar_real)
-    df_tabela['margem'] = (df_tabela['lucro'] / df_tabela['receita'] * 100).round(1)
-    
-    tabela_dados = df_tabela[['mes_ano', 'receita_formatada', 'despesas_formatada', 'lucro_formatado', 'margem']].to_dict('records')
-    
-    return cards, fig_principal, fig_anual, tabela_dados
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='cards'),
+        Output('cards-metricas', 'children'),
+        [Input('filtro-ano', 'value'),
+         Input('dados-agregados', 'data')]
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='graficoPrincipal'),
+        Output('grafico-principal', 'figure'),
+        [Input('filtro-ano', 'value'),
+         Input('dados-agregados', 'data')],
+        [State('grafico-principal', 'figure')]
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='graficoAnual'),
+        Output('grafico-anual', 'figure'),
+        [Input('filtro-ano', 'value'),
+         Input('dados-agregados', 'data')],
+        [State('grafico-anual', 'figure')]
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='tabela'),
+        [Output('tabela-simples', 'data'),
+         Output('tabela-simples', 'page_count'),
+         Output('tabela-simples', 'page_current')],
+        [Input('filtro-ano', 'value'),
+         Input('tabela-simples', 'page_current'),
+         Input('tabela-simples', 'page_size'),
+         Input('tabela-simples', 'sort_by'),
+         Input('dados-agregados', 'data')]
+    )
 
-@server.route("/")
-def index():
+@etapas.cronometrar('pagina_inicial')
+def renderizar_pagina_inicial(atual, destino='/dashboard/'):
+    todos = atual['cubo']['todos']
     return f"""
     <!DOCTYPE html>
     <html>
@@ -619,23 +1906,23 @@ def index():
         <div class="container">
             <h1>Dashboard</h1>
             <p>Dashboard Financeiro Simplificado</p>
-            <a href="/dashboard/" class="btn">Acessar Dashboard</a>
+            <a href="{destino}" class="btn">Acessar Dashboard</a>
             
             <div class="stats">
                 <div class="stat">
-                    <div class="stat-value">{formatar_real(df['receita'].sum())}</div>
+                    <div class="stat-value">{formatar_real(todos['receita'])}</div>
                     <div class="stat-label">Receita Total</div>
                 </div>
                 <div class="stat">
-                    <div class="stat-value">{formatar_real(df['lucro'].sum())}</div>
+                    <div class="stat-value">{formatar_real(todos['lucro'])}</div>
                     <div class="stat-label">Lucro Total</div>
                 </div>
                 <div class="stat">
-                    <div class="stat-value">{len(df)}</div>
+                    <div class="stat-value">{len(atual['df'])}</div>
                     <div class="stat-label">Meses</div>
                 </div>
                 <div class="stat">
-                    <div class="stat-value">{(df['lucro'].sum()/df['receita'].sum()*100):.1f}%</div>
+                    <div class="stat-value">{todos['margem']:.1f}%</div>
                     <div class="stat-label">Margem</div>
                 </div>
             </div>
@@ -644,7 +1931,370 @@ def index():
     </html>
     """
 
-if __name__ == '__main__':
+@etapas.cronometrar('compressao')
+def comprimir_pagina(conteudo):
+    return compressao.variantes(conteudo)
+
+def obter_pagina_inicial():
+    global pagina_inicial
+    pagina, atual = pagina_inicial, estado
+    if pagina is None or pagina['versao'] != atual['versao']:
+        html_pagina = renderizar_pagina_inicial(atual).encode('utf-8')
+        pagina = {
+            'versao': atual['versao'],
+            'codificacoes': comprimir_pagina(html_pagina) if PRECOMPRIMIR_PAGINA_INICIAL else {None: html_pagina},
+            'etag': hashlib.sha1(html_pagina).hexdigest(),
+            'modificado_em': atual['atualizado_em']
+        }
+        pagina_inicial = pagina
+    return pagina
+
+@server.route("/")
+def index():
+    pagina = obter_pagina_inicial()
+    codificacao = compressao.escolher_codificacao(request.accept_encodings)
+    if codificacao not in pagina['codificacoes']:
+        codificacao = None
+    resposta = Response(pagina['codificacoes'][codificacao], mimetype='text/html')
+    if codificacao is not None:
+        resposta.headers['Content-Encoding'] = codificacao
+        resposta.set_etag(f"{pagina['etag']}-{codificacao}")
+    else:
+        resposta.set_etag(pagina['etag'])
+    resposta.last_modified = pagina['modificado_em']
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.vary.add('Accept-Encoding')
+    return resposta.make_conditional(request)
+
+COLUNAS_EXPORTACAO = ['data', 'periodo', 'receita', 'despesas', 'lucro', 'margem']
+
+def blocos_exportacao(visao, ordenacao, linhas_por_bloco):
+    # Valores brutos, sem a formatação da tabela; margem sem arredondar e
+    # vazia quando não há receita.
+    linhas = visao['linhas']
+    ordem = visao['ordens'].get(ordenacao) if ordenacao else None
+    for inicio in range(0, max(len(linhas), 1), linhas_por_bloco):
+        if ordem is None:
+            fatia = linhas.iloc[inicio:inicio + linhas_por_bloco]
+        else:
+            fatia = linhas.iloc[ordem[inicio:inicio + linhas_por_bloco]]
+        receita, lucro = para_reais(fatia['receita'].to_numpy()), para_reais(fatia['lucro'].to_numpy())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            margem = np.where(receita != 0, lucro / receita * 100, np.nan)
+        yield pd.DataFrame({
+            'data': fatia['data'].to_numpy(),
+            'periodo': fatia['mes_ano'].to_numpy(dtype=object),
+            'receita': receita,
+            'despesas': para_reais(fatia['despesas'].to_numpy()),
+            'lucro': lucro,
+            'margem': margem
+        }, columns=COLUNAS_EXPORTACAO)
+
+FORMATOS_EXPORTACAO = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+@server.route('/exportar')
+def exportar():
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACAO:
+        return Response(f"Formato desconhecido: {formato}", status=400, mimetype='text/plain')
+    ano = request.args.get('ano', 'todos')
+    ano = int(ano) if ano.lstrip('-').isdigit() else ano
+    # Um mês vem da barra clicada no gráfico anual, como na tabela.
+    mes = request.args.get('mes', '')
+    mes = int(mes) if mes.isdigit() and ano != 'todos' else None
+    ordenacao = None
+    if request.args.get('ordenar') in ORDENACAO_TABELA:
+        ordenacao = (request.args['ordenar'], 'desc' if request.args.get('direcao') == 'desc' else 'asc')
+    oficina = request.args.get('oficina', OFICINA)
+    if not existe_oficina(oficina):
+        return Response(f"Oficina desconhecida: {oficina}", status=404, mimetype='text/plain')
+
+    atual, cache = contexto_oficina(oficina)
+    visao = visao_tabela(ano, mes, atual, cache)
+    blocos = blocos_exportacao(visao, ordenacao, LINHAS_POR_BLOCO_EXPORTACAO)
+    if formato == 'csv':
+        partes = exportacao.csv_em_partes(blocos)
+    else:
+        partes = exportacao.xlsx_em_partes(blocos, COLUNAS_EXPORTACAO, len(visao['linhas']))
+    if len(visao['linhas']) > LIMITE_EXPORTACAO_DIRETA:
+        partes = exportacao.em_segundo_plano(executor_exportacao, partes)
+
+    resposta = Response(partes, mimetype=FORMATOS_EXPORTACAO[formato])
+    nome = f'dashboard-{ano}' if ano in atual['cubo'] else 'dashboard'
+    if mes is not None and ano in atual['cubo']:
+        nome = f'{nome}-{mes:02d}'
+    if oficina != OFICINA:
+        nome = f'{nome}-{oficina}'
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome}.{formato}"'
+    resposta.headers['Cache-Control'] = 'no-store'
+    return resposta
+
+def rota_metricas():
+    if request.path.endswith('_dash-update-component'):
+        corpo = request.get_json(silent=True) or {}
+        return 'callback:' + str(corpo.get('output', '')).strip('.').split('.')[0]
+    return request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+
+@server.before_request
+def iniciar_medicao():
+    if request.path == '/metrics':
+        return
+    g.inicio_requisicao = time.perf_counter()
+    g.perfil = perfis_lentos.iniciar() if perfis_lentos is not None else None
+
+@server.after_request
+def registrar_medicao(resposta):
+    if 'inicio_requisicao' not in g:
+        return resposta
+    duracao = time.perf_counter() - g.inicio_requisicao
+    rota = rota_metricas()
+    duracao_requisicoes.observar(duracao, rota)
+    respostas.incrementar(rota, str(resposta.status_code))
+    if g.perfil is not None:
+        perfis_lentos.finalizar(g.perfil, f'{request.method} {request.path} ({rota})', duracao)
+        g.perfil = None
+    return resposta
+
+@server.teardown_request
+def liberar_perfil(_):
+    # Uma exceção pula o after_request; o perfil ainda precisa ser encerrado.
+    if g.get('perfil') is not None:
+        perfis_lentos.finalizar(g.perfil, f'{request.method} {request.path}', time.perf_counter() - g.inicio_requisicao)
+
+def oficina_do_callback(corpo):
+    for entrada in [*corpo.get('inputs', []), *corpo.get('state', [])]:
+        if isinstance(entrada, dict) and entrada.get('id') == 'url' and entrada.get('property') == 'pathname':
+            return oficina_da_url(entrada.get('value'))
+    return OFICINA
+
+def chave_resposta():
+    # Os callbacks são funções das entradas e da versão dos dados, então o
+    # corpo da requisição identifica a resposta. Devolve também o cache onde
+    # ela fica: cada oficina guarda as suas respostas junto com o estado.
+    if request.method == 'POST' and request.path.endswith('_dash-update-component'):
+        corpo = request.get_json(silent=True) or {}
+        oficina = g.oficina = oficina_do_callback(corpo)
+        # Callbacks em segundo plano respondem com identificadores assinados
+        # para a página e depois com o andamento da tarefa: nada a repetir.
+        if any(nome in request.args for nome in ('cacheKey', 'job', 'oldJob', 'cancelJob')):
+            return None, None
+        if app.callback_map.get(corpo.get('output'), {}).get('background'):
+            return None, None
+        if oficina == OFICINA:
+            atual, cache = estado, cache_respostas
+        else:
+            # Oficina ainda não carregada: o callback carrega e a próxima
+            # requisição já entra no cache.
+            carregada = oficinas.carregada(oficina)
+            if carregada is None:
+                return None, None
+            atual, _, cache, _ = carregada
+        return cache, ('callback', oficina, atual['versao'], hashlib.blake2b(request.get_data(), digest_size=16).digest())
+    # O layout é fixo; o Dash o serializaria de novo a cada carregamento.
+    if request.method == 'GET' and request.path.endswith('_dash-layout'):
+        return cache_respostas, ('layout', estado['versao'])
+    return None, None
+
+@server.before_request
+def verificar_oficina():
+    # /dashboard/<oficina>/ é servido pelo Dash; nomes que não existem no
+    # armazenamento dão 404, e a carga começa enquanto o navegador ainda
+    # baixa os scripts.
+    partes = request.path.strip('/').split('/')
+    if request.method != 'GET' or len(partes) < 2 or partes[0] != 'dashboard':
+        return None
+    oficina = partes[1]
+    if oficina.startswith('_') or oficina == 'assets' or oficina == OFICINA:
+        return None
+    if not armazenamento.existe(oficina):
+        return Response(f"Oficina desconhecida: {oficina}", status=404, mimetype='text/plain')
+    if oficinas.carregada(oficina) is None:
+        executor_oficinas.submit(oficinas.obter, oficina)
+    return None
+
+@server.before_request
+def servir_resposta_em_cache():
+    g.cache_resposta, g.chave_resposta = chave_resposta()
+    if g.chave_resposta is None:
+        return None
+    codificacoes = g.cache_resposta.buscar(g.chave_resposta)
+    if codificacoes is None:
+        return None
+    chave, g.chave_resposta = g.chave_resposta, None
+    completas, codificacao = compressao.completar(codificacoes, compressao.escolher_codificacao(request.accept_encodings))
+    if completas is not codificacoes:
+        g.cache_resposta.guardar(chave, completas)
+    return compressao.aplicar(Response(mimetype='application/json'), completas, codificacao)
+
+@server.after_request
+def medir_oficina(resposta):
+    # O Flask roda os after_request na ordem inversa: este vem depois de
+    # comprimir_resposta, com a resposta já no cache da oficina.
+    oficina = g.get('oficina')
+    if oficina is not None and oficina != OFICINA:
+        oficinas.medir_novamente(oficina)
+    return resposta
+
+@server.after_request
+def comprimir_resposta(resposta):
+    codificacao = compressao.escolher_codificacao(request.accept_encodings)
+    if g.get('chave_resposta') is not None and resposta.status_code == 200 and not resposta.is_streamed:
+        # Guarda já comprimida: acertos futuros não comprimem de novo.
+        codificacoes, codificacao = compressao.completar(
+            {None: resposta.get_data()}, codificacao if compressao.comprimivel(resposta) else None
+        )
+        g.cache_resposta.guardar(g.chave_resposta, codificacoes)
+        return compressao.aplicar(resposta, codificacoes, codificacao)
+
+    if codificacao is None or not compressao.comprimivel(resposta):
+        return resposta
+    if '_dash-component-suites' in request.path and resposta.cache_control.max_age:
+        # Arquivos com impressão digital na URL nunca mudam.
+        codificacoes = cache_estaticos.obter(
+            (request.path, codificacao),
+            lambda: {codificacao: compressao.comprimir(resposta.get_data(), codificacao)}
+        )
+        return compressao.aplicar(resposta, codificacoes, codificacao)
+    return compressao.aplicar(resposta, {codificacao: compressao.comprimir(resposta.get_data(), codificacao)}, codificacao)
+
+class ColetaSaidas(dict):
+    # Faz as vezes do cache nos processos de aquecimento: guarda tudo o que
+    # foi calculado para ser devolvido ao processo principal.
+    def obter(self, chave, calcular):
+        if chave not in self:
+            self[chave] = calcular()
+        return self[chave]
+
+def calcular_aquecimento(tarefas):
+    # Roda num processo do pool, criado por fork: o estado e as oficinas
+    # carregadas são herdados e só as saídas prontas voltam.
+    resultado = []
+    for indice, oficina, ano, inicio, fim in tarefas:
+        atual, _ = contexto_oficina(oficina)
+        coleta = ColetaSaidas()
+        if inicio is None and fim is None:
+            saida_analises(ano, atual, coleta)
+        if not MODO_CLIENTE:
+            saida_cards(ano, inicio, fim, atual, coleta)
+            saida_grafico_principal(ano, inicio, fim, 'mes', atual, coleta)
+            saida_grafico_anual(ano, inicio, fim, atual, coleta)
+        resultado.append((indice, oficina, atual['versao'], [
+            (chave, valor) for chave, valor in coleta.items() if chave[0] != 'visao-periodo'
+        ]))
+    return resultado
+
+ultimo_aquecimento = {'segundos': 0.0, 'saidas': 0}
+
+@etapas.cronometrar('aquecimento')
+def aquecer_saidas(processos=None, oficinas_extras=None):
+    # Calcula as saídas de cada ano do filtro (e de cada período configurado)
+    # e as guarda no cache de cada oficina antes de o worker receber tráfego.
+    inicio_aquecimento = time.perf_counter()
+    processos = AQUECER_PROCESSOS if processos is None else processos
+    nomes = [OFICINA, *(AQUECER_OFICINAS if oficinas_extras is None else oficinas_extras)]
+    # O período sem filtro vai por último, com os anos mais recentes e
+    # 'todos' no fim: são essas saídas que ficam se o cache não comportar
+    # todas.
+    periodos_aquecer = [*((ler_data(inicio), ler_data(fim)) for inicio, fim in AQUECER_PERIODOS), (None, None)]
+
+    tarefas, caches = [], {}
+    for oficina in dict.fromkeys(nomes):
+        if not existe_oficina(oficina):
+            logger.warning("Oficina %s para aquecer não existe", oficina)
+            continue
+        atual, caches[oficina] = contexto_oficina(oficina)
+        caches[oficina].obter(('opcoes-ano', atual['versao']), lambda: opcoes_ano(atual['cubo']))
+        if MODO_CLIENTE:
+            caches[oficina].obter(('dados-agregados', atual['versao']), lambda: montar_dados_cliente(atual['df'], atual['cubo']))
+        anos = [*sorted(chave for chave in atual['cubo'] if chave != 'todos'), 'todos']
+        for inicio, fim in periodos_aquecer:
+            for ano in anos:
+                tarefas.append((len(tarefas), oficina, ano, inicio, fim))
+
+    if processos > 1 and threading.active_count() > 1:
+        # Um fork com outras threads rodando pode herdar uma trava presa
+        # por elas no processo filho.
+        logger.warning("Aquecimento no próprio processo: há %d threads rodando", threading.active_count())
+        processos = 1
+    if processos > 1 and len(tarefas) > 1:
+        partes = [tarefas[i::processos] for i in range(min(processos, len(tarefas)))]
+        with ProcessPoolExecutor(len(partes), mp_context=multiprocessing.get_context('fork')) as pool:
+            resultados = [item for parte in pool.map(calcular_aquecimento, partes) for item in parte]
+    else:
+        resultados = calcular_aquecimento(tarefas)
+
+    guardadas = dict.fromkeys(caches, 0)
+    for _, oficina, versao, itens in sorted(resultados, key=lambda item: item[0]):
+        atual, cache = (estado, cache_dashboard) if oficina == OFICINA else (oficinas.carregada(oficina) or (None, None))[:2]
+        # Uma recarga (ou a remoção da oficina) durante o aquecimento deixa
+        # essas saídas obsoletas.
+        if atual is None or atual['versao'] != versao or cache is not caches[oficina]:
+            continue
+        for chave, valor in itens:
+            cache.guardar(chave, valor)
+        guardadas[oficina] += len(itens)
+    for oficina, quantidade in guardadas.items():
+        if quantidade > caches[oficina].tamanho_maximo:
+            logger.warning(
+                "O cache da oficina %s guarda %d itens e %d saídas foram aquecidas; as mais antigas foram descartadas",
+                oficina, caches[oficina].tamanho_maximo, quantidade
+            )
+    for oficina in guardadas:
+        if oficina != OFICINA:
+            oficinas.medir_novamente(oficina)
+    saidas = sum(guardadas.values())
+
+    ultimo_aquecimento.update(segundos=time.perf_counter() - inicio_aquecimento, saidas=saidas)
+    return {**ultimo_aquecimento, 'processos': processos, 'oficinas': len(caches)}
+
+def aquecer():
+    # Feito antes do fork, o preparo do Dash na primeira requisição e o
+    # layout serializado ficam prontos e são herdados por todos os workers.
+    aquecimento = aquecer_saidas() if AQUECER_PROCESSOS else None
+    with server.test_client() as cliente:
+        for caminho in ('/', '/dashboard/', '/dashboard/_dash-layout', '/dashboard/_dash-dependencies'):
+            cliente.get(caminho, headers={'Accept-Encoding': 'gzip, br'})
+    return aquecimento
+
+@registro_metricas.coletor
+def metricas_estado():
+    estatisticas = cache_dashboard.estatisticas()
+    tamanhos = oficinas.tamanhos()
+    tarefas = fila_tarefas.estatisticas()
+    return [
+        ('dashboard_cache_acertos_total', 'counter', 'Acertos do cache de saídas', estatisticas['acertos']),
+        ('dashboard_cache_falhas_total', 'counter', 'Falhas do cache de saídas', estatisticas['falhas']),
+        ('dashboard_cache_remocoes_total', 'counter', 'Itens removidos do cache por tamanho', estatisticas['remocoes']),
+        ('dashboard_cache_itens', 'gauge', 'Itens no cache de saídas', estatisticas['tamanho']),
+        ('dashboard_dados_versao', 'gauge', 'Versão dos dados em uso', estado['versao']),
+        ('dashboard_dados_linhas', 'gauge', 'Linhas no dataframe em uso', len(estado['df'])),
+        ('dashboard_oficinas_carregadas', 'gauge', 'Oficinas carregadas além da padrão', len(tamanhos)),
+        ('dashboard_oficinas_memoria_bytes', 'gauge', 'Memória estimada das oficinas carregadas além da padrão', sum(tamanhos.values())),
+        ('dashboard_oficinas_orcamento_bytes', 'gauge', 'Orçamento de memória das oficinas', ORCAMENTO_OFICINAS),
+        ('dashboard_oficinas_cargas_total', 'counter', 'Oficinas carregadas do armazenamento', oficinas.cargas),
+        ('dashboard_oficinas_remocoes_total', 'counter', 'Oficinas removidas da memória pelo orçamento', oficinas.remocoes),
+        ('dashboard_aquecimento_segundos', 'gauge', 'Duração do último aquecimento das saídas', ultimo_aquecimento['segundos']),
+        ('dashboard_aquecimento_saidas', 'gauge', 'Saídas guardadas no último aquecimento', ultimo_aquecimento['saidas']),
+        ('dashboard_tarefas_iniciadas_total', 'counter', 'Tarefas em segundo plano iniciadas por este worker', tarefas['iniciadas']),
+        ('dashboard_tarefas_compartilhadas_total', 'counter', 'Pedidos atendidos por uma tarefa igual já existente', tarefas['compartilhadas']),
+        ('dashboard_tarefas_canceladas_total', 'counter', 'Tarefas canceladas por não terem mais quem espere', tarefas['canceladas']),
+        ('dashboard_tarefas_esgotadas_total', 'counter', 'Tarefas interrompidas pelo tempo limite', tarefas['esgotadas']),
+        ('dashboard_tarefas_em_execucao', 'gauge', 'Tarefas rodando em processos deste worker', tarefas['em_execucao'])
+    ]
+
+@server.route('/metrics')
+def metricas():
+    return Response(registro_metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+if __name__ == '__main__' and PUBLICADOR:
+    # Processo que mantém os agregados publicados para os trabalhadores.
+    print(f"Publicador de dados - versão {estado['versao']} em {DIRETORIO_COMPARTILHADO}")
+    sys.stdout.flush()
+    threading.Event().wait()
+elif __name__ == '__main__':
     print("Dashboard Financeiro - Servidor Iniciado")
     print("-" * 40)
     print(f"URL: http://127.0.0.1:5000/dashboard/")
@@ -0,0 +1,271 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from recarga import mesclar_dados
+
+MESES = [
+    'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
+]
+
+COLUNAS_VALORES = ['receita', 'despesas', 'lucro']
+
+
+# Nas colunas os valores ficam em centavos inteiros: somas exatas, sem o
+# desvio acumulado do float. Reais em float só na saída.
+def para_centavos(valores):
+    valores = np.asarray(valores)
+    if np.issubdtype(valores.dtype, np.integer):
+        return valores.astype(np.int64, copy=False)
+    return np.rint(valores * 100).astype(np.int64)
+
+
+def para_reais(centavos):
+    return np.asarray(centavos, dtype=np.int64) / 100
+
+
+def json_para_colunas(dados_json):
+    anos = [ano for ano, meses in dados_json.items() for _ in meses]
+    nomes_meses = [mes for meses in dados_json.values() for mes in meses]
+    valores = [v for meses in dados_json.values() for v in meses.values()]
+
+    codigos = pd.Categorical(nomes_meses, categories=MESES).codes
+    if (codigos < 0).any():
+        invalidos = sorted({mes for mes, codigo in zip(nomes_meses, codigos) if codigo < 0})
+        raise ValueError(f"Meses desconhecidos: {', '.join(invalidos)}")
+
+    colunas = {'ano': np.array(anos, dtype=np.int16), 'mes_num': (codigos + 1).astype(np.int8)}
+    for coluna in COLUNAS_VALORES:
+        colunas[coluna] = para_centavos(np.fromiter((v[coluna] for v in valores), dtype=np.float64, count=len(valores)))
+    return colunas
+
+
+def colunas_para_json(colunas):
+    dados = {}
+    reais = [para_reais(colunas[coluna]).tolist() for coluna in COLUNAS_VALORES]
+    for ano, mes_num, *valores in zip(colunas['ano'].tolist(), colunas['mes_num'].tolist(), *reais):
+        dados.setdefault(str(ano), {})[MESES[mes_num - 1]] = dict(zip(COLUNAS_VALORES, valores))
+    return dados
+
+
+def _inicios_grupos(chaves):
+    if len(chaves) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.concatenate([[True], chaves[1:] != chaves[:-1]]))
+
+
+def _somar_grupos(valores, inicios):
+    return np.add.reduceat(valores, inicios) if len(inicios) else valores[:0]
+
+
+def agregar_colunas(colunas, anos=None):
+    # Aceita as colunas ou o df, ambos em centavos; soma por faixas
+    # contíguas de cada mês depois de ordenar pela chave ano/mês.
+    ano = np.asarray(colunas['ano'])
+    chave = ano.astype(np.int64) * 12 + np.asarray(colunas['mes_num'], dtype=np.int64) - 1
+    centavos = {coluna: para_centavos(colunas[coluna]) for coluna in COLUNAS_VALORES}
+    total = pd.Series([int(valores.sum()) for valores in centavos.values()], index=COLUNAS_VALORES) / 100
+
+    if anos is not None:
+        manter = np.isin(ano, list(anos))
+        chave, centavos = chave[manter], {coluna: valores[manter] for coluna, valores in centavos.items()}
+    if len(chave) > 1 and (chave[1:] < chave[:-1]).any():
+        ordem = np.argsort(chave, kind='stable')
+        chave, centavos = chave[ordem], {coluna: valores[ordem] for coluna, valores in centavos.items()}
+
+    inicios_mes = _inicios_grupos(chave)
+    meses = chave[inicios_mes]
+    por_mes = {coluna: _somar_grupos(valores, inicios_mes) for coluna, valores in centavos.items()}
+    inicios_ano = _inicios_grupos(meses // 12)
+    return {
+        'total': total,
+        'por_ano': pd.DataFrame(
+            {coluna: para_reais(_somar_grupos(valores, inicios_ano)) for coluna, valores in por_mes.items()},
+            index=pd.Index((meses[inicios_ano] // 12).astype(ano.dtype), name='ano')
+        ),
+        'por_ano_mes': pd.DataFrame({
+            'ano': (meses // 12).astype(ano.dtype),
+            'mes_num': (meses % 12 + 1).astype(np.int8),
+            **{coluna: para_reais(valores) for coluna, valores in por_mes.items()}
+        })
+    }
+
+
+class ArmazenamentoMemoria:
+    def __init__(self, dados_por_oficina=None):
+        self._dados = {oficina: mesclar_dados(dados) for oficina, dados in (dados_por_oficina or {}).items()}
+        self._lock = threading.Lock()
+
+    def oficinas(self):
+        return sorted(self._dados)
+
+    def existe(self, oficina):
+        return oficina in self._dados
+
+    def ler(self, oficina):
+        return mesclar_dados(self._dados.get(oficina, {}))
+
+    def colunas(self, oficina):
+        colunas = json_para_colunas(self._dados.get(oficina, {}))
+        ordem = np.lexsort((colunas['mes_num'], colunas['ano']))
+        return {coluna: valores[ordem] for coluna, valores in colunas.items()}
+
+    def agregados(self, oficina, anos=None):
+        return agregar_colunas(self.colunas(oficina), anos)
+
+    def gravar(self, oficina, dados_json, substituir=False):
+        json_para_colunas(dados_json)
+        with self._lock:
+            base = {} if substituir else self._dados.get(oficina, {})
+            self._dados[oficina] = mesclar_dados(base, dados_json)
+
+
+class PoolConexoes:
+    def __init__(self, caminho, tamanho=4):
+        self.caminho = caminho
+        self._vagas = threading.BoundedSemaphore(tamanho)
+        self._livres = queue.LifoQueue()
+        self._pid = os.getpid()
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+        conexao.execute('PRAGMA journal_mode=WAL')
+        conexao.execute('PRAGMA synchronous=NORMAL')
+        return conexao
+
+    @contextmanager
+    def conexao(self):
+        if self._pid != os.getpid():
+            # Conexões herdadas de um fork não podem ser usadas pelo filho.
+            self._livres = queue.LifoQueue()
+            self._pid = os.getpid()
+        with self._vagas:
+            try:
+                conexao = self._livres.get_nowait()
+            except queue.Empty:
+                conexao = self._conectar()
+            try:
+                with conexao:
+                    yield conexao
+            finally:
+                self._livres.put(conexao)
+
+    def fechar(self):
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# A tabela guarda reais (REAL); leituras e somas convertem para centavos no
+# próprio SQLite, e a soma de inteiros lá também é exata.
+EM_CENTAVOS = {coluna: f'CAST(ROUND({coluna} * 100) AS INTEGER)' for coluna in COLUNAS_VALORES}
+CENTAVOS = ', '.join(EM_CENTAVOS.values())
+
+
+class ArmazenamentoSQLite:
+    def __init__(self, caminho, tamanho_pool=4):
+        self.pool = PoolConexoes(caminho, tamanho_pool)
+        with self.pool.conexao() as conexao:
+            conexao.executescript('''
+                CREATE TABLE IF NOT EXISTS meses (
+                    oficina TEXT NOT NULL,
+                    ano INTEGER NOT NULL,
+                    mes_num INTEGER NOT NULL,
+                    receita REAL NOT NULL,
+                    despesas REAL NOT NULL,
+                    lucro REAL NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_meses_oficina_ano_mes ON meses (oficina, ano, mes_num);
+            ''')
+
+    def oficinas(self):
+        with self.pool.conexao() as conexao:
+            return [linha[0] for linha in conexao.execute('SELECT DISTINCT oficina FROM meses ORDER BY oficina')]
+
+    def existe(self, oficina):
+        with self.pool.conexao() as conexao:
+            return conexao.execute('SELECT 1 FROM meses WHERE oficina = ? LIMIT 1', (oficina,)).fetchone() is not None
+
+    def ler(self, oficina):
+        return colunas_para_json(self.colunas(oficina))
+
+    def colunas(self, oficina):
+        with self.pool.conexao() as conexao:
+            linhas = conexao.execute(
+                f'SELECT ano, mes_num, {CENTAVOS} FROM meses WHERE oficina = ? ORDER BY ano, mes_num',
+                (oficina,)
+            ).fetchall()
+        valores = np.array(linhas, dtype=np.int64).reshape(-1, 5)
+        return {
+            'ano': valores[:, 0].astype(np.int16),
+            'mes_num': valores[:, 1].astype(np.int8),
+            **{coluna: np.ascontiguousarray(valores[:, i + 2]) for i, coluna in enumerate(COLUNAS_VALORES)}
+        }
+
+    def agregados(self, oficina, anos=None):
+        filtro, parametros = 'oficina = ?', [oficina]
+        if anos is not None:
+            anos = sorted(int(ano) for ano in anos)
+            filtro += f" AND ano IN ({', '.join('?' * len(anos))})"
+            parametros += anos
+        somas = ', '.join(f'SUM({EM_CENTAVOS[coluna]}) / 100.0 AS {coluna}' for coluna in COLUNAS_VALORES)
+
+        with self.pool.conexao() as conexao:
+            total = conexao.execute(f'SELECT {somas} FROM meses WHERE oficina = ?', (oficina,)).fetchone()
+            por_ano = pd.read_sql_query(
+                f'SELECT ano, {somas} FROM meses WHERE {filtro} GROUP BY ano ORDER BY ano',
+                conexao, params=parametros, index_col='ano'
+            )
+            por_ano_mes = pd.read_sql_query(
+                f'SELECT ano, mes_num, {somas} FROM meses WHERE {filtro} GROUP BY ano, mes_num ORDER BY ano, mes_num',
+                conexao, params=parametros
+            )
+        por_ano.index = por_ano.index.astype(np.int16)
+        return {
+            'total': pd.Series([valor or 0.0 for valor in total], index=COLUNAS_VALORES),
+            'por_ano': por_ano,
+            'por_ano_mes': por_ano_mes.astype({'ano': np.int16, 'mes_num': np.int8})
+        }
+
+    def gravar(self, oficina, dados_json, substituir=False):
+        colunas = json_para_colunas(dados_json)
+        linhas = zip(
+            [oficina] * len(colunas['ano']),
+            colunas['ano'].tolist(),
+            colunas['mes_num'].tolist(),
+            *(para_reais(colunas[coluna]).tolist() for coluna in COLUNAS_VALORES)
+        )
+        with self.pool.conexao() as conexao:
+            if substituir:
+                conexao.execute('DELETE FROM meses WHERE oficina = ?', (oficina,))
+            conexao.executemany('''
+                INSERT INTO meses (oficina, ano, mes_num, receita, despesas, lucro) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (oficina, ano, mes_num) DO UPDATE SET
+                    receita = excluded.receita, despesas = excluded.despesas, lucro = excluded.lucro
+            ''', linhas)
+
+    def fechar(self):
+        self.pool.fechar()
+
+
+def abrir_armazenamento(endereco, dados_iniciais=None):
+    # Oficinas que ainda não existem no armazenamento recebem os dados iniciais.
+    dados_iniciais = dados_iniciais or {}
+    if not endereco or endereco == 'memoria':
+        return ArmazenamentoMemoria(dados_iniciais)
+    if endereco.startswith('sqlite:///'):
+        armazenamento = ArmazenamentoSQLite(endereco[len('sqlite:///'):])
+        existentes = set(armazenamento.oficinas())
+        for oficina, dados in dados_iniciais.items():
+            if oficina not in existentes:
+                armazenamento.gravar(oficina, dados)
+        return armazenamento
+    raise ValueError(f"Armazenamento desconhecido: {endereco}")
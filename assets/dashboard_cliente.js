@@ -0,0 +1,264 @@
+// Callbacks do modo cliente (DASHBOARD_MODO_CLIENTE=1): recebem os agregados
+// uma vez em dados-agregados e reproduzem no navegador as saídas dos
+// callbacks do servidor, com os mesmos números e a mesma formatação. Os links
+// de exportação também são montados aqui, nos dois modos.
+(function () {
+    const TIPOS = {
+        f8: Float64Array,
+        i4: Int32Array,
+        i2: Int16Array,
+        u1: Uint8Array
+    };
+    const ORDENACAO_TABELA = {
+        mes_ano: 'data',
+        receita_formatada: 'receita',
+        despesas_formatada: 'despesas',
+        lucro_formatado: 'lucro',
+        margem: 'margem'
+    };
+    const COLUNAS_VALORES = ['receita', 'despesas', 'lucro'];
+    const decodificados = new WeakMap();
+
+    function decodificarArray(coluna) {
+        const binario = atob(coluna.bdata);
+        const bytes = new Uint8Array(binario.length);
+        for (let i = 0; i < binario.length; i++) {
+            bytes[i] = binario.charCodeAt(i);
+        }
+        return new TIPOS[coluna.dtype](bytes.buffer);
+    }
+
+    function decodificarGrupo(grupo) {
+        const resultado = {};
+        Object.keys(grupo).forEach(function (nome) {
+            resultado[nome] = decodificarArray(grupo[nome]);
+        });
+        return resultado;
+    }
+
+    function obterDados(dados) {
+        if (!decodificados.has(dados)) {
+            decodificados.set(dados, {
+                linhas: decodificarGrupo(dados.linhas),
+                anual: decodificarGrupo(dados.anual),
+                mensal: decodificarGrupo(dados.mensal)
+            });
+        }
+        return decodificados.get(dados);
+    }
+
+    // Mesmo resultado de f"{valor:.Nf}" no Python: toFixed arredonda o valor
+    // exato do double, mas desempata para cima, enquanto o Python desempata
+    // para o par. Com 1 ou 2 casas, empates exatos só ocorrem em múltiplos
+    // ímpares de 1/4 ou 1/8.
+    function fixo(valor, casas) {
+        if (Number.isNaN(valor)) {
+            return 'nan';
+        }
+        if (!Number.isFinite(valor)) {
+            return valor > 0 ? 'inf' : '-inf';
+        }
+        const negativo = valor < 0 || Object.is(valor, -0);
+        const absoluto = Math.abs(valor);
+        const passo = casas === 2 ? 8 : 4;
+        let texto;
+        if (Number.isInteger(absoluto * passo) && !Number.isInteger(absoluto * passo / 2)) {
+            const fator = Math.pow(10, casas);
+            let n = Math.floor(absoluto * fator);
+            if (n % 2 === 1) {
+                n += 1;
+            }
+            texto = Math.floor(n / fator).toString() + '.' + (n % fator).toString().padStart(casas, '0');
+        } else {
+            texto = absoluto.toFixed(casas);
+        }
+        return (negativo ? '-' : '') + texto;
+    }
+
+    function formatarReal(valor) {
+        const texto = fixo(valor, 2);
+        if (texto.indexOf('.') === -1) {
+            return 'R$ ' + texto;
+        }
+        const partes = texto.split('.');
+        const sinal = partes[0].charAt(0) === '-' ? '-' : '';
+        const inteiro = sinal ? partes[0].slice(1) : partes[0];
+        return 'R$ ' + sinal + inteiro.replace(/\B(?=(\d{3})+(?!\d))/g, '.') + ',' + partes[1];
+    }
+
+    function obterVisao(dados, ano) {
+        const visao = dados.visoes[String(ano)];
+        if (visao) {
+            return visao;
+        }
+        return {
+            titulo_periodo: 'Ano ' + ano,
+            titulo_anual: 'Comparativo Mensal - ' + ano,
+            totais: [0, 0, 0, 0]
+        };
+    }
+
+    function posicoesDoAno(colunaAno, ano) {
+        const posicoes = [];
+        for (let i = 0; i < colunaAno.length; i++) {
+            if (ano === 'todos' || colunaAno[i] === ano) {
+                posicoes.push(i);
+            }
+        }
+        return posicoes;
+    }
+
+    function dataIso(dias) {
+        return new Date(dias * 86400000).toISOString().slice(0, 19);
+    }
+
+    function foiAcionado(propriedade) {
+        const contexto = window.dash_clientside.callback_context;
+        return (contexto.triggered || []).some(function (item) {
+            return item.prop_id === propriedade;
+        });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        dashboard: {
+            cards: function (ano, dados) {
+                if (!dados) {
+                    return window.dash_clientside.no_update;
+                }
+                const totais = obterVisao(dados, ano).totais;
+                const textos = [
+                    formatarReal(totais[0]),
+                    formatarReal(totais[1]),
+                    formatarReal(totais[2]),
+                    fixo(totais[3], 1) + '%'
+                ];
+                const cards = JSON.parse(JSON.stringify(dados.modelo_cards));
+                cards.forEach(function (card, indice) {
+                    card.props.children[1].props.children = textos[indice];
+                });
+                return cards;
+            },
+
+            graficoPrincipal: function (ano, dados, figura) {
+                if (!dados) {
+                    return window.dash_clientside.no_update;
+                }
+                const linhas = obterDados(dados).linhas;
+                const posicoes = posicoesDoAno(linhas.ano, ano);
+                const x = posicoes.map(function (i) { return dataIso(linhas.data[i]); });
+                const visao = obterVisao(dados, ano);
+                return Object.assign({}, figura, {
+                    data: figura.data.map(function (trace, indice) {
+                        const coluna = linhas[COLUNAS_VALORES[indice]];
+                        return Object.assign({}, trace, {
+                            x: x,
+                            y: posicoes.map(function (i) { return coluna[i]; })
+                        });
+                    }),
+                    layout: Object.assign({}, figura.layout, {
+                        title: Object.assign({}, figura.layout.title, {
+                            text: 'Evolução Mensal - ' + visao.titulo_periodo
+                        }),
+                        uirevision: visao.titulo_periodo
+                    })
+                });
+            },
+
+            graficoAnual: function (ano, dados, figura) {
+                if (!dados) {
+                    return window.dash_clientside.no_update;
+                }
+                const decodificado = obterDados(dados);
+                const origem = ano === 'todos' ? decodificado.anual : decodificado.mensal;
+                const posicoes = ano === 'todos'
+                    ? posicoesDoAno(origem.ano, 'todos')
+                    : posicoesDoAno(origem.ano, ano);
+                const x = posicoes.map(function (i) {
+                    return ano === 'todos' ? origem.ano[i] : dados.abreviacoes_meses[origem.mes_num[i] - 1];
+                });
+                return Object.assign({}, figura, {
+                    data: figura.data.map(function (trace, indice) {
+                        const coluna = origem[COLUNAS_VALORES[indice]];
+                        return Object.assign({}, trace, {
+                            x: x,
+                            y: posicoes.map(function (i) { return coluna[i]; })
+                        });
+                    }),
+                    layout: Object.assign({}, figura.layout, {
+                        title: Object.assign({}, figura.layout.title, {
+                            text: obterVisao(dados, ano).titulo_anual
+                        })
+                    })
+                });
+            },
+
+            tabela: function (ano, pagina, tamanhoPagina, ordenacao, dados) {
+                if (!dados) {
+                    return window.dash_clientside.no_update;
+                }
+                const linhas = obterDados(dados).linhas;
+                let posicoes = posicoesDoAno(linhas.ano, ano);
+
+                if (ordenacao && ordenacao.length) {
+                    const origem = ORDENACAO_TABELA[ordenacao[0].column_id];
+                    if (origem) {
+                        const chave = linhas[origem];
+                        posicoes = posicoes.slice().sort(function (a, b) {
+                            const va = chave[a];
+                            const vb = chave[b];
+                            if (Number.isNaN(va) || Number.isNaN(vb)) {
+                                return Number.isNaN(va) - Number.isNaN(vb);
+                            }
+                            return va - vb;
+                        });
+                        if (ordenacao[0].direction === 'desc') {
+                            posicoes.reverse();
+                        }
+                    }
+                }
+
+                tamanhoPagina = tamanhoPagina || 12;
+                const paginas = Math.max(1, Math.ceil(posicoes.length / tamanhoPagina));
+                pagina = foiAcionado('filtro-ano.value') ? 0 : (pagina || 0);
+                pagina = Math.min(Math.max(pagina, 0), paginas - 1);
+
+                const registros = posicoes
+                    .slice(pagina * tamanhoPagina, (pagina + 1) * tamanhoPagina)
+                    .map(function (i) {
+                        return {
+                            mes_ano: dados.rotulos_mes_ano[linhas.mes_ano[i]],
+                            receita_formatada: formatarReal(linhas.receita[i]),
+                            despesas_formatada: formatarReal(linhas.despesas[i]),
+                            lucro_formatado: formatarReal(linhas.lucro[i]),
+                            margem: linhas.margem[i]
+                        };
+                    });
+                return [registros, paginas, pagina];
+            },
+
+            linksExportacao: function (ano, ordenacao, selecao, pathname) {
+                const parametros = new URLSearchParams({ano: ano === undefined || ano === null ? 'todos' : ano});
+                // A barra clicada no gráfico anual restringe a exportação
+                // como restringe a tabela.
+                if (selecao) {
+                    parametros.set('ano', selecao.ano);
+                    if (selecao.mes_num !== undefined && selecao.mes_num !== null) {
+                        parametros.set('mes', selecao.mes_num);
+                    }
+                }
+                const partes = (pathname || '').split('/').filter(Boolean);
+                if (partes.length >= 2 && partes[0] === 'dashboard') {
+                    parametros.set('oficina', partes[1]);
+                }
+                if (ordenacao && ordenacao.length) {
+                    parametros.set('ordenar', ordenacao[0].column_id);
+                    parametros.set('direcao', ordenacao[0].direction);
+                }
+                return ['csv', 'xlsx'].map(function (formato) {
+                    parametros.set('formato', formato);
+                    return '/exportar?' + parametros.toString();
+                });
+            }
+        }
+    });
+})();
@@ -0,0 +1,268 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.sinteticos import gerar_json
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_ATUALIZACAO = '/dashboard/_dash-update-component'
+CABECALHOS = {'Accept-Encoding': 'gzip, br', 'Connection': 'keep-alive'}
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def iniciar_servidor(dados, workers, diretorio):
+    with open(os.path.join(diretorio, 'dados.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo)
+    porta = porta_livre()
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{porta}', 'app:server'],
+        cwd=RAIZ,
+        env={**os.environ, 'DASHBOARD_DIR_DADOS': diretorio, 'DASHBOARD_INTERVALO_RECARGA': '3600'},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    limite = time.monotonic() + 120
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f"Servidor terminou com código {processo.returncode}")
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=5)
+            conexao.request('GET', '/dashboard/_dash-dependencies')
+            if conexao.getresponse().status == 200:
+                return processo, f'127.0.0.1:{porta}'
+        except OSError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError("Servidor não respondeu a tempo")
+
+
+def corpo_requisicao(dependencia, valores, alterado):
+    saida = dependencia['output']
+    if saida.startswith('..'):
+        saidas = [dict(zip(('id', 'property'), s.split('.', 1))) for s in saida.strip('.').split('...')]
+    else:
+        saidas = dict(zip(('id', 'property'), saida.split('.', 1)))
+    return {
+        'output': saida,
+        'outputs': saidas,
+        'inputs': [dict(e, value=valores.get(f"{e['id']}.{e['property']}")) for e in dependencia['inputs']],
+        'state': [dict(e, value=valores.get(f"{e['id']}.{e['property']}")) for e in dependencia.get('state', [])],
+        'changedPropIds': [alterado]
+    }
+
+
+class Cliente:
+    def __init__(self, endereco):
+        self.endereco = endereco
+        self.conexao = None
+        self.medicoes = []
+
+    def requisitar(self, nome, metodo, caminho, corpo=None):
+        cabecalhos = dict(CABECALHOS)
+        if corpo is not None:
+            corpo = json.dumps(corpo).encode('utf-8')
+            cabecalhos['Content-Type'] = 'application/json'
+        if self.conexao is None:
+            self.conexao = http.client.HTTPConnection(*self.endereco.split(':'), timeout=60)
+
+        inicio = time.perf_counter()
+        try:
+            self.conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+            resposta = self.conexao.getresponse()
+            conteudo = resposta.read()
+            status = resposta.status
+        except (OSError, http.client.HTTPException):
+            self.conexao.close()
+            self.conexao = None
+            conteudo, status = b'', 0
+        duracao = time.perf_counter() - inicio
+        self.medicoes.append((nome, duracao, len(conteudo), status))
+        return duracao
+
+
+def sessao(endereco, dependencias, filtros, trocas, semente, medicoes_troca):
+    # Um usuário abre a página inicial e o dashboard e depois troca o filtro
+    # de ano; às vezes também pagina a tabela, como no navegador.
+    aleatorio = random.Random(semente)
+    cliente = Cliente(endereco)
+    cliente.requisitar('pagina_inicial', 'GET', '/')
+    cliente.requisitar('dashboard', 'GET', '/dashboard/')
+    cliente.requisitar('dash_layout', 'GET', '/dashboard/_dash-layout')
+
+    for _ in range(trocas):
+        valores = {'filtro-ano.value': aleatorio.choice(filtros), 'tabela-simples.page_size': 12, 'tabela-simples.sort_by': []}
+        duracao = 0.0
+        for dependencia in dependencias:
+            if 'filtro-ano.value' in [f"{e['id']}.{e['property']}" for e in dependencia['inputs']]:
+                nome = 'callback:' + dependencia['output'].strip('.').split('.')[0]
+                duracao += cliente.requisitar(nome, 'POST', CAMINHO_ATUALIZACAO, corpo_requisicao(dependencia, valores, 'filtro-ano.value'))
+        medicoes_troca.append(duracao)
+
+        if aleatorio.random() < 0.3:
+            valores['tabela-simples.page_current'] = aleatorio.randint(1, 3)
+            for dependencia in dependencias:
+                if dependencia['output'].startswith('..tabela-simples.data'):
+                    cliente.requisitar('callback:tabela-paginacao', 'POST', CAMINHO_ATUALIZACAO,
+                                       corpo_requisicao(dependencia, valores, 'tabela-simples.page_current'))
+    return cliente.medicoes
+
+
+def resumir(duracoes, tamanhos=None):
+    duracoes = np.asarray(duracoes) * 1000
+    resumo = {
+        'n': int(len(duracoes)),
+        'p50_ms': float(np.percentile(duracoes, 50)),
+        'p95_ms': float(np.percentile(duracoes, 95)),
+        'p99_ms': float(np.percentile(duracoes, 99)),
+        'media_ms': float(duracoes.mean())
+    }
+    if tamanhos is not None:
+        resumo['bytes_medio'] = float(np.mean(tamanhos))
+    return resumo
+
+
+def executar_cenario(endereco, concorrencia, trocas, semente):
+    conexao = http.client.HTTPConnection(*endereco.split(':'), timeout=60)
+    conexao.request('GET', '/dashboard/_dash-dependencies')
+    dependencias = [d for d in json.loads(conexao.getresponse().read()) if not d.get('clientside_function')]
+    conexao.request('GET', '/dashboard/_dash-layout')
+    layout = json.loads(conexao.getresponse().read())
+    conexao.close()
+    filtros = [opcao['value'] for opcao in encontrar_opcoes(layout)]
+
+    resultados = [None] * concorrencia
+    medicoes_troca = []
+
+    def usuario(indice):
+        resultados[indice] = sessao(endereco, dependencias, filtros, trocas, semente + indice, medicoes_troca)
+
+    threads = [threading.Thread(target=usuario, args=(i,)) for i in range(concorrencia)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    medicoes = [medicao for lista in resultados for medicao in lista]
+    por_endpoint = {}
+    for nome, segundos, tamanho, status in medicoes:
+        por_endpoint.setdefault(nome, ([], []))
+        por_endpoint[nome][0].append(segundos)
+        por_endpoint[nome][1].append(tamanho)
+    return {
+        'concorrencia': concorrencia,
+        'duracao_s': duracao,
+        'requisicoes': len(medicoes),
+        'erros': sum(1 for *_, status in medicoes if status != 200),
+        'vazao_rps': len(medicoes) / duracao,
+        'filtros': len(filtros),
+        'troca_filtro': resumir(medicoes_troca),
+        'endpoints': {nome: resumir(*valores) for nome, valores in sorted(por_endpoint.items())}
+    }
+
+
+def encontrar_opcoes(componente):
+    if isinstance(componente, dict):
+        if componente.get('props', {}).get('id') == 'filtro-ano':
+            return componente['props']['options']
+        return encontrar_opcoes(componente.get('props', {}).get('children'))
+    if isinstance(componente, list):
+        for filho in componente:
+            opcoes = encontrar_opcoes(filho)
+            if opcoes:
+                return opcoes
+    return []
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(anterior, atual):
+    chave = lambda cenario: (cenario['anos'], cenario['concorrencia'])
+    base = {chave(cenario): cenario for cenario in anterior['cenarios']}
+    print(f"\n{'anos':>6} {'conc':>5} {'p95 antes':>10} {'p95 agora':>10} {'Δ p95':>7} {'rps antes':>10} {'rps agora':>10}")
+    for cenario in atual['cenarios']:
+        if chave(cenario) not in base:
+            continue
+        antes = base[chave(cenario)]
+        p95_antes, p95_agora = antes['troca_filtro']['p95_ms'], cenario['troca_filtro']['p95_ms']
+        print(f"{cenario['anos']:>6} {cenario['concorrencia']:>5} {p95_antes:>9.1f}ms {p95_agora:>9.1f}ms "
+              f"{p95_agora / p95_antes - 1:>+7.0%} {antes['vazao_rps']:>10.1f} {cenario['vazao_rps']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência e vazão do dashboard sob carga, contra um servidor local")
+    parser.add_argument('--anos', type=int, nargs='+', default=[3, 30, 300], help="tamanhos dos conjuntos sintéticos, em anos")
+    parser.add_argument('--concorrencia', type=int, nargs='+', default=[1, 4, 16], help="usuários simultâneos")
+    parser.add_argument('--trocas', type=int, default=50, help="trocas de filtro por usuário")
+    parser.add_argument('--workers', type=int, default=2, help="workers do gunicorn")
+    parser.add_argument('--endereco', help="servidor já em execução (host:porta); ignora --anos")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default='resultados_carga.json', help="arquivo JSON com os resultados")
+    parser.add_argument('--comparar', help="resultado anterior para comparar")
+    args = parser.parse_args()
+
+    resultado = {
+        'executado_em': datetime.now(timezone.utc).isoformat(),
+        'commit': commit_atual(),
+        'parametros': vars(args),
+        'cenarios': []
+    }
+
+    tamanhos = [None] if args.endereco else args.anos
+    print(f"{'anos':>6} {'conc':>5} {'req':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'bytes/troca':>12} {'erros':>6}")
+    for anos in tamanhos:
+        with tempfile.TemporaryDirectory() as diretorio:
+            processo = None
+            endereco = args.endereco
+            if endereco is None:
+                processo, endereco = iniciar_servidor(gerar_json(anos, semente=args.semente), args.workers, diretorio)
+            try:
+                for concorrencia in args.concorrencia:
+                    cenario = {'anos': anos, **executar_cenario(endereco, concorrencia, args.trocas, args.semente)}
+                    resultado['cenarios'].append(cenario)
+                    troca = cenario['troca_filtro']
+                    bytes_troca = sum(
+                        resumo['bytes_medio'] for nome, resumo in cenario['endpoints'].items()
+                        if nome.startswith('callback:') and nome != 'callback:tabela-paginacao'
+                    )
+                    print(f"{anos!s:>6} {concorrencia:>5} {cenario['requisicoes']:>7} {cenario['vazao_rps']:>8.1f} "
+                          f"{troca['p50_ms']:>6.1f}ms {troca['p95_ms']:>6.1f}ms {troca['p99_ms']:>6.1f}ms "
+                          f"{bytes_troca:>12,.0f} {cenario['erros']:>6}")
+            finally:
+                if processo is not None:
+                    processo.terminate()
+                    processo.wait()
+
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, indent=2)
+    print(f"\nResultados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            comparar(json.load(arquivo), resultado)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import colunas_para_dataframe, indexar_datas
+from armazenamento import COLUNAS_VALORES, agregar_colunas, para_centavos
+from benchmarks.bench_ingestao import ingestao_linha_a_linha
+from benchmarks.sinteticos import gerar_colunas
+
+
+def cronometrar(funcao, repeticoes):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def agregar_float(colunas):
+    # Como era antes: groupby em float64 direto sobre os reais.
+    tabela = pd.DataFrame({coluna: colunas[coluna] for coluna in ['ano', 'mes_num', *COLUNAS_VALORES]})
+    return {
+        'total': tabela[COLUNAS_VALORES].sum(),
+        'por_ano': tabela.groupby('ano')[COLUNAS_VALORES].sum(),
+        'por_ano_mes': tabela.groupby(['ano', 'mes_num'])[COLUNAS_VALORES].sum().reset_index()
+    }
+
+
+def bytes_colunas(colunas):
+    return sum(valores.nbytes for valores in colunas.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Colunas em centavos inteiros vs. reais em float64")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--linha-a-linha-ate', type=int, default=100_000,
+                        help="maior tamanho medido também com o df de objetos montado linha a linha")
+    parser.add_argument('--consultas', type=int, default=10_000, help="intervalos aleatórios somados pelo índice")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    print(f"{'linhas':>11} {'objetos':>9} {'df':>9} {'centavos':>9} "
+          f"{'soma float':>11} {'soma int':>9} {'ganho':>6} {'erro float':>11} {'erro int':>9} {'divergem':>9}")
+    for linhas in args.linhas:
+        reais = gerar_colunas(linhas)
+        # Colunas como o armazenamento entrega: centavos e chaves compactas.
+        colunas = {
+            'ano': reais['ano'].astype(np.int16),
+            'mes_num': reais['mes_num'].astype(np.int8),
+            'dia': reais['dia'].astype(np.int8),
+            **{coluna: para_centavos(reais[coluna]) for coluna in COLUNAS_VALORES}
+        }
+
+        objetos = '-'
+        if linhas <= args.linha_a_linha_ate:
+            objetos = f"{ingestao_linha_a_linha(reais).memory_usage(deep=True).sum() / 2**20:>7.1f}MB"
+        df = colunas_para_dataframe(**colunas)
+
+        tempo_float, _ = cronometrar(lambda: agregar_float(reais), args.repeticoes)
+        tempo_int, agregados = cronometrar(lambda: agregar_colunas(colunas), args.repeticoes)
+        soma_int = agregados['por_ano_mes'].set_index(['ano', 'mes_num'])
+        exato = pd.DataFrame({'ano': colunas['ano'], 'mes_num': colunas['mes_num'], 'receita': colunas['receita']}) \
+            .groupby(['ano', 'mes_num'])['receita'].sum()
+        if ((soma_int['receita'] * 100).round().astype(np.int64) != exato).any():
+            raise SystemExit(f"soma em centavos divergente com {linhas} linhas")
+
+        # Intervalos arbitrários pelas somas acumuladas, como no filtro de
+        # período: em float o erro cresce com a distância do começo da série.
+        indice = indexar_datas(df)
+        acumulado_float = np.concatenate([[0.0], np.cumsum(np.asarray(reais['receita'], dtype=np.float64))])
+        acumulado_exato = np.concatenate([[0], np.cumsum(colunas['receita'])])
+        i, j = np.sort(rng.integers(0, linhas + 1, (2, args.consultas)), axis=0)
+        esperado = acumulado_exato[j] - acumulado_exato[i]
+        erro_float = np.abs((acumulado_float[j] - acumulado_float[i]) * 100 - esperado)
+        erro_int = np.abs((indice['receita'][j] - indice['receita'][i]) - esperado)
+        divergem = int((np.rint((acumulado_float[j] - acumulado_float[i]) * 100) != esperado).sum())
+
+        print(f"{linhas:>11,} {objetos:>9} {df.memory_usage(deep=True).sum() / 2**20:>7.1f}MB "
+              f"{bytes_colunas(colunas) / 2**20:>7.1f}MB {tempo_float:>10.4f}s {tempo_int:>8.4f}s "
+              f"{tempo_float / tempo_int:>5.1f}x {erro_float.max():>9.4f}¢ {erro_int.max():>8.0f}¢ {divergem:>9,}")
+
+
+if __name__ == '__main__':
+    main()
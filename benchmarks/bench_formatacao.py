@@ -0,0 +1,45 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import formatar_real, formatar_real_serie
+
+
+def cronometrar(funcao, repeticoes):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="formatar_real célula a célula vs. formatar_real_serie")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    print(f"{'linhas':>10} {'apply (s)':>10} {'vetor (s)':>10} {'cache (s)':>10} {'ganho':>8}")
+    for linhas in args.linhas:
+        serie = pd.Series(np.round(rng.uniform(-50_000, 500_000, linhas), 2))
+
+        tempo_apply, esperado = cronometrar(lambda: serie.apply(formatar_real), args.repeticoes)
+        tempo_vetor, obtido = cronometrar(lambda: formatar_real_serie(serie), args.repeticoes)
+
+        cache = {}
+        formatar_real_serie(serie, cache=cache, tamanho_maximo_cache=linhas)
+        tempo_cache, obtido_cache = cronometrar(
+            lambda: formatar_real_serie(serie, cache=cache, tamanho_maximo_cache=linhas), args.repeticoes
+        )
+
+        if obtido.tolist() != esperado.tolist() or obtido_cache.tolist() != esperado.tolist():
+            raise SystemExit(f"saída divergente de formatar_real com {linhas} linhas")
+        print(f"{linhas:>10,} {tempo_apply:>10.4f} {tempo_vetor:>10.4f} {tempo_cache:>10.4f} {tempo_apply / tempo_vetor:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from app import MESES, colunas_para_dataframe
+from benchmarks.sinteticos import gerar_colunas
+
+
+def ingestao_linha_a_linha(colunas):
+    rows = []
+    for ano, mes_num, dia, receita, despesas, lucro in zip(
+        colunas['ano'].tolist(), colunas['mes_num'].tolist(), colunas['dia'].tolist(),
+        colunas['receita'].tolist(), colunas['despesas'].tolist(), colunas['lucro'].tolist()
+    ):
+        mes = {i + 1: nome for i, nome in enumerate(MESES)}[mes_num]
+        rows.append({
+            'data': datetime(ano, mes_num, dia),
+            'ano': ano,
+            'mes': mes,
+            'mes_num': mes_num,
+            'mes_ano': f"{mes[:3]}/{ano}",
+            'receita': receita,
+            'despesas': despesas,
+            'lucro': lucro
+        })
+    return pd.DataFrame(rows).sort_values('data')
+
+
+def ingestao_colunar(colunas):
+    return colunas_para_dataframe(
+        colunas['ano'], colunas['mes_num'], colunas['receita'],
+        colunas['despesas'], colunas['lucro'], dia=colunas['dia']
+    )
+
+
+def medir(funcao, colunas):
+    inicio = time.perf_counter()
+    df = funcao(colunas)
+    duracao = time.perf_counter() - inicio
+    tamanho = df.memory_usage(deep=True).sum()
+    del df
+
+    # O tracemalloc deixa o laço em Python bem mais lento, então o pico
+    # de memória é medido numa segunda execução.
+    tracemalloc.start()
+    funcao(colunas)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico, tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo e pico de memória da ingestão do dataframe")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--linha-a-linha-ate', type=int, default=100_000,
+                        help="maior tamanho medido também com a ingestão linha a linha")
+    args = parser.parse_args()
+
+    print(f"{'linhas':>12} {'caminho':>14} {'tempo (s)':>10} {'pico (MB)':>10} {'df (MB)':>10}")
+    for linhas in args.linhas:
+        colunas = gerar_colunas(linhas)
+        caminhos = [('colunar', ingestao_colunar)]
+        if linhas <= args.linha_a_linha_ate:
+            caminhos.append(('linha a linha', ingestao_linha_a_linha))
+        for nome, funcao in caminhos:
+            duracao, pico, tamanho = medir(funcao, colunas)
+            print(f"{linhas:>12,} {nome:>14} {duracao:>10.3f} {pico / 2**20:>10.1f} {tamanho / 2**20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
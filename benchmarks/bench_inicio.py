@@ -0,0 +1,138 @@
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_carga import CABECALHOS, RAIZ, porta_livre
+from benchmarks.sinteticos import gerar_json
+
+MODOS = {
+    'padrao': {},
+    'rapido': {'DASHBOARD_INICIO_RAPIDO': '1'}
+}
+
+# Roda num processo novo: mede o import do app e as primeiras requisições
+# que um navegador faz ao abrir o dashboard.
+MEDIR_PROCESSO = '''
+import json, sys, time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+cliente = app.server.test_client()
+tempos = []
+for caminho in ('/dashboard/', '/dashboard/_dash-layout', '/dashboard/_dash-layout'):
+    antes = time.perf_counter()
+    assert cliente.get(caminho, headers={'Accept-Encoding': 'gzip'}).status_code == 200
+    tempos.append(time.perf_counter() - antes)
+print(json.dumps({
+    'import_s': importado - inicio,
+    'primeira_requisicao_s': tempos[0],
+    'primeiro_layout_s': tempos[1],
+    'segundo_layout_s': tempos[2],
+    'modulos': len(sys.modules)
+}))
+'''
+
+
+def ambiente(modo, diretorio, extra=None):
+    return {
+        **os.environ,
+        **MODOS[modo],
+        **(extra or {}),
+        'DASHBOARD_DIR_DADOS': diretorio,
+        'DASHBOARD_INTERVALO_RECARGA': '3600'
+    }
+
+
+def medir_processo(modo, diretorio):
+    saida = subprocess.run(
+        [sys.executable, '-c', MEDIR_PROCESSO],
+        cwd=RAIZ, env=ambiente(modo, diretorio), capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def medir_gunicorn(modo, diretorio, workers, precarregar):
+    # Tempo até a primeira resposta do layout e a latência dela: com o app
+    # pré-carregado o worker já nasce com dados, layout e Dash prontos.
+    porta = porta_livre()
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{porta}', 'app:server'],
+        cwd=RAIZ,
+        env=ambiente(modo, diretorio, {'DASHBOARD_PRECARREGAR': '1' if precarregar else '0'}),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        limite = time.monotonic() + 120
+        while time.monotonic() < limite:
+            if processo.poll() is not None:
+                raise RuntimeError(f"Servidor terminou com código {processo.returncode}")
+            try:
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=60)
+                antes = time.perf_counter()
+                conexao.request('GET', '/dashboard/_dash-layout', headers=CABECALHOS)
+                resposta = conexao.getresponse()
+                resposta.read()
+                if resposta.status == 200:
+                    agora = time.perf_counter()
+                    return {'pronto_s': agora - inicio, 'primeira_requisicao_s': agora - antes}
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("Servidor não respondeu a tempo")
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def mediana(medicoes):
+    return {chave: float(np.median([medicao[chave] for medicao in medicoes])) for chave in medicoes[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de inicialização do app e da primeira requisição")
+    parser.add_argument('--anos', type=int, default=30, help="tamanho do conjunto sintético, em anos")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4, help="workers do gunicorn")
+    parser.add_argument('--sem-gunicorn', action='store_true', help="mede só o processo isolado")
+    parser.add_argument('--saida', help="arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    resultado = {'parametros': vars(args), 'processo': {}, 'gunicorn': {}}
+    with tempfile.TemporaryDirectory() as diretorio:
+        with open(os.path.join(diretorio, 'dados.json'), 'w', encoding='utf-8') as arquivo:
+            json.dump(gerar_json(args.anos), arquivo)
+
+        print(f"{'modo':>8} {'import':>9} {'1ª req':>9} {'1º layout':>10} {'2º layout':>10} {'módulos':>8}")
+        for modo in MODOS:
+            medida = mediana([medir_processo(modo, diretorio) for _ in range(args.repeticoes)])
+            resultado['processo'][modo] = medida
+            print(f"{modo:>8} {medida['import_s'] * 1000:>7.0f}ms {medida['primeira_requisicao_s'] * 1000:>7.1f}ms "
+                  f"{medida['primeiro_layout_s'] * 1000:>8.1f}ms {medida['segundo_layout_s'] * 1000:>8.1f}ms "
+                  f"{medida['modulos']:>8.0f}")
+
+        if not args.sem_gunicorn:
+            print(f"\n{'modo':>8} {'preload':>8} {'pronto':>9} {'1ª req':>9}  (gunicorn, {args.workers} workers)")
+            for modo in MODOS:
+                for precarregar in (False, True):
+                    medida = mediana([
+                        medir_gunicorn(modo, diretorio, args.workers, precarregar) for _ in range(args.repeticoes)
+                    ])
+                    resultado['gunicorn'][f"{modo}{'+preload' if precarregar else ''}"] = medida
+                    print(f"{modo:>8} {'sim' if precarregar else 'não':>8} {medida['pronto_s'] * 1000:>7.0f}ms "
+                          f"{medida['primeira_requisicao_s'] * 1000:>7.1f}ms")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
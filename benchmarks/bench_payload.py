@@ -0,0 +1,85 @@
+import argparse
+
+from plotly.io.json import to_json_plotly
+
+import app
+
+CAMINHO_ATUALIZACAO = '/dashboard/_dash-update-component'
+
+
+def resposta_monolitica(ano_selecionado):
+    visao = app.obter_visao(ano_selecionado)
+
+    fig_principal = app.figura_principal_base()
+    fig_principal.layout.title.text = f"Evolução Mensal - {visao['titulo_periodo']}"
+    fig_anual = app.figura_anual_base()
+    fig_anual.layout.title.text = visao['titulo_anual']
+    for indice, coluna in enumerate(app.COLUNAS_VALORES):
+        fig_principal.data[indice].x = visao['linhas']['data']
+        fig_principal.data[indice].y = app.para_reais(visao['linhas'][coluna])
+        fig_anual.data[indice].x = visao['anual']['x']
+        fig_anual.data[indice].y = visao['anual'][coluna]
+
+    resposta = {
+        'multi': True,
+        'response': {
+            'cards-metricas': {'children': app.montar_cards(visao)},
+            'grafico-principal': {'figure': fig_principal},
+            'grafico-anual': {'figure': fig_anual},
+            'tabela-simples': {'data': visao['tabela'].to_dict('records')}
+        }
+    }
+    return len(to_json_plotly(resposta).encode())
+
+
+def corpo_requisicao(dependencia, ano_selecionado):
+    saida = dependencia['output']
+    if saida.startswith('..'):
+        saidas = [dict(zip(('id', 'property'), s.split('.', 1))) for s in saida.strip('.').split('...')]
+    else:
+        saidas = dict(zip(('id', 'property'), saida.split('.', 1)))
+    entradas = [
+        dict(entrada, value=ano_selecionado if entrada['id'] == 'filtro-ano' else None)
+        for entrada in dependencia['inputs']
+    ]
+    return {
+        'output': saida,
+        'outputs': saidas,
+        'inputs': entradas,
+        'state': [dict(estado, value=None) for estado in dependencia.get('state', [])],
+        'changedPropIds': ['filtro-ano.value']
+    }
+
+
+def respostas_divididas(cliente, dependencias, ano_selecionado):
+    tamanhos = {}
+    for dependencia in dependencias:
+        if not any(entrada['id'] == 'filtro-ano' for entrada in dependencia['inputs']):
+            continue
+        resposta = cliente.post(CAMINHO_ATUALIZACAO, json=corpo_requisicao(dependencia, ano_selecionado))
+        if resposta.status_code == 200:
+            tamanhos[dependencia['output']] = len(resposta.data)
+    return tamanhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes enviados por troca de filtro, antes e depois da divisão do callback")
+    parser.parse_args()
+
+    cliente = app.server.test_client()
+    dependencias = [d for d in cliente.get('/dashboard/_dash-dependencies').get_json() if not d.get('clientside_function')]
+    filtros = ['todos'] + sorted(chave for chave in app.cubo if chave != 'todos')
+
+    print(f"{'filtro':>8} {'antes':>10} {'depois':>10} {'redução':>9}")
+    total_antes = total_depois = 0
+    for filtro in filtros:
+        antes = resposta_monolitica(filtro)
+        depois = sum(respostas_divididas(cliente, dependencias, filtro).values())
+        total_antes += antes
+        total_depois += depois
+        print(f"{filtro!s:>8} {antes:>10,} {depois:>10,} {1 - depois / antes:>8.0%}")
+    print(f"{'total':>8} {total_antes:>10,} {total_depois:>10,} {1 - total_depois / total_antes:>8.0%}")
+
+
+if __name__ == '__main__':
+    main()
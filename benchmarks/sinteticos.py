@@ -0,0 +1,41 @@
+import numpy as np
+
+from armazenamento import MESES
+
+
+def gerar_colunas(linhas, ano_inicial=2000, anos=30, semente=42):
+    rng = np.random.default_rng(semente)
+    dias = np.sort(rng.integers(0, anos * 365, linhas))
+    datas = np.datetime64(f'{ano_inicial}-01-01') + dias
+    meses = datas.astype('datetime64[M]')
+
+    ano = meses.astype('datetime64[Y]').astype(np.int64) + 1970
+    mes_num = meses.astype(np.int64) % 12 + 1
+    dia = (datas - meses.astype('datetime64[D]')).astype(np.int64) + 1
+
+    receita = np.round(rng.uniform(50, 5000, linhas), 2)
+    despesas = np.round(receita * rng.uniform(0.3, 0.8, linhas), 2)
+    return {
+        'ano': ano,
+        'mes_num': mes_num,
+        'dia': dia,
+        'receita': receita,
+        'despesas': despesas,
+        'lucro': np.round(receita - despesas, 2)
+    }
+
+
+def gerar_json(anos, ano_final=2025, semente=42):
+    # Mesmo formato de dados_oficina_json: ano -> mês -> valores.
+    rng = np.random.default_rng(semente)
+    receita = np.round(rng.uniform(2500, 5500, (anos, 12)), 2)
+    despesas = np.round(receita * rng.uniform(0.4, 0.65, (anos, 12)), 2)
+    lucro = np.round(receita - despesas, 2)
+    receita, despesas, lucro = receita.tolist(), despesas.tolist(), lucro.tolist()
+    return {
+        str(ano_final - anos + 1 + i): {
+            mes: {'receita': receita[i][m], 'despesas': despesas[i][m], 'lucro': lucro[i][m]}
+            for m, mes in enumerate(MESES)
+        }
+        for i in range(anos)
+    }
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    def __init__(self, tamanho_maximo=64, medir=None):
+        if tamanho_maximo < 1:
+            raise ValueError("tamanho_maximo deve ser pelo menos 1")
+        self.tamanho_maximo = tamanho_maximo
+        # Com `medir`, mantém em `bytes` a soma do tamanho dos itens.
+        self.medir = medir
+        self.bytes = 0
+        self._tamanhos = {}
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self._itens = OrderedDict()
+        self._geracao = 0
+        self._lock = threading.Lock()
+
+    def obter(self, chave, calcular):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+            geracao = self._geracao
+
+        valor = calcular()
+
+        with self._lock:
+            # Um recarregamento durante o cálculo torna o valor obsoleto.
+            if geracao == self._geracao:
+                self._inserir(chave, valor)
+        return valor
+
+    def buscar(self, chave, padrao=None):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+            return padrao
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._inserir(chave, valor)
+
+    def _inserir(self, chave, valor):
+        self._itens[chave] = valor
+        self._itens.move_to_end(chave)
+        if self.medir is not None:
+            tamanho = self.medir(valor)
+            self.bytes += tamanho - self._tamanhos.get(chave, 0)
+            self._tamanhos[chave] = tamanho
+        while len(self._itens) > self.tamanho_maximo:
+            removida, _ = self._itens.popitem(last=False)
+            self.bytes -= self._tamanhos.pop(removida, 0)
+            self.remocoes += 1
+
+    def invalidar(self):
+        with self._lock:
+            self._itens.clear()
+            self._tamanhos.clear()
+            self.bytes = 0
+            self._geracao += 1
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'tamanho': len(self._itens),
+                'tamanho_maximo': self.tamanho_maximo,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'remocoes': self.remocoes
+            }
+
+    def __contains__(self, chave):
+        # Consulta sem contar acerto ou falha nem mexer na ordem.
+        with self._lock:
+            return chave in self._itens
+
+    def __len__(self):
+        return len(self._itens)
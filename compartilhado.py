@@ -0,0 +1,129 @@
+import json
+import logging
+import math
+import mmap
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ALINHAMENTO = 64
+PONTEIRO = 'atual.json'
+
+
+def _alinhar(posicao):
+    return posicao + (-posicao % ALINHAMENTO)
+
+
+def _escrever_atomico(caminho, conteudo):
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def publicar(diretorio, versao, arrays, meta=None):
+    # Um arquivo por versão: cabeçalho JSON seguido dos arrays alinhados.
+    # Em /dev/shm o arquivo fica em memória e os processos que o mapeiam
+    # compartilham as mesmas páginas.
+    os.makedirs(diretorio, exist_ok=True)
+    arrays = {nome: np.ascontiguousarray(valores) for nome, valores in arrays.items()}
+
+    descricao, fim = {}, 0
+    for nome, valores in arrays.items():
+        inicio = _alinhar(fim)
+        descricao[nome] = {'dtype': valores.dtype.str, 'shape': list(valores.shape), 'offset': inicio}
+        fim = inicio + valores.nbytes
+    cabecalho = json.dumps({'versao': versao, 'meta': meta or {}, 'arrays': descricao}).encode('utf-8')
+    base = _alinhar(8 + len(cabecalho))
+
+    nome_arquivo = f'dados-{versao}.bin'
+    caminho = os.path.join(diretorio, nome_arquivo)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(len(cabecalho).to_bytes(8, 'little'))
+        arquivo.write(cabecalho)
+        for nome, valores in arrays.items():
+            arquivo.seek(base + descricao[nome]['offset'])
+            arquivo.write(memoryview(valores).cast('B'))
+        arquivo.truncate(base + fim)
+    os.replace(temporario, caminho)
+
+    anterior = versao_publicada(diretorio)
+    _escrever_atomico(
+        os.path.join(diretorio, PONTEIRO),
+        json.dumps({'versao': versao, 'arquivo': nome_arquivo}).encode('utf-8')
+    )
+
+    # A versão anterior fica para quem leu o ponteiro antigo e ainda vai
+    # abrir o arquivo; quem já mapeou uma versão removida continua lendo.
+    manter = {nome_arquivo, f'dados-{anterior}.bin'}
+    for entrada in os.scandir(diretorio):
+        if entrada.name.startswith('dados-') and entrada.name.endswith('.bin') and entrada.name not in manter:
+            os.unlink(entrada.path)
+
+
+def versao_publicada(diretorio):
+    try:
+        with open(os.path.join(diretorio, PONTEIRO), 'rb') as arquivo:
+            return json.load(arquivo)['versao']
+    except FileNotFoundError:
+        return None
+
+
+def anexar(diretorio, tentativas=3):
+    for tentativa in range(tentativas):
+        with open(os.path.join(diretorio, PONTEIRO), 'rb') as arquivo:
+            ponteiro = json.load(arquivo)
+        try:
+            with open(os.path.join(diretorio, ponteiro['arquivo']), 'rb') as arquivo:
+                mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+            break
+        except FileNotFoundError:
+            if tentativa == tentativas - 1:
+                raise
+
+    tamanho = int.from_bytes(mapa[:8], 'little')
+    cabecalho = json.loads(mapa[8:8 + tamanho])
+    base = _alinhar(8 + tamanho)
+
+    # Visões somente leitura sobre o mapa, sem cópia.
+    arrays = {}
+    for nome, descricao in cabecalho['arrays'].items():
+        arrays[nome] = np.frombuffer(
+            mapa,
+            dtype=np.dtype(descricao['dtype']),
+            count=math.prod(descricao['shape']),
+            offset=base + descricao['offset']
+        ).reshape(descricao['shape'])
+    return cabecalho['versao'], arrays, cabecalho['meta']
+
+
+class MonitorVersao:
+    def __init__(self, diretorio, ao_mudar, intervalo=5.0):
+        self.diretorio = diretorio
+        self.ao_mudar = ao_mudar
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.ao_mudar(versao_publicada(self.diretorio))
+            except Exception:
+                logger.exception("Falha ao anexar a versão publicada em %s", self.diretorio)
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name='monitor-versao', daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,67 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TAMANHO_MINIMO = 512
+TIPOS_COMPRIMIVEIS = ('application/json', 'application/javascript', 'text/', 'image/svg+xml')
+
+# Respostas guardadas em cache são comprimidas uma vez só, então valem um
+# nível mais alto; as demais são comprimidas a cada requisição.
+NIVEIS_CACHE = {'br': 5, 'gzip': 9}
+NIVEIS_DINAMICOS = {'br': 4, 'gzip': 6}
+
+
+def escolher_codificacao(aceitas):
+    if brotli is not None and aceitas['br']:
+        return 'br'
+    if aceitas['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir(conteudo, codificacao, niveis=NIVEIS_DINAMICOS):
+    if codificacao == 'br':
+        return brotli.compress(conteudo, quality=niveis['br'])
+    return gzip.compress(conteudo, compresslevel=niveis['gzip'], mtime=0)
+
+
+def variantes(conteudo, niveis=NIVEIS_CACHE):
+    codificadas = {None: conteudo, 'gzip': comprimir(conteudo, 'gzip', niveis)}
+    if brotli is not None:
+        codificadas['br'] = comprimir(conteudo, 'br', niveis)
+    return codificadas
+
+
+def completar(codificacoes, codificacao, niveis=NIVEIS_CACHE):
+    # Cada variante é comprimida só quando algum cliente a pede; devolve um
+    # dicionário novo quando acrescenta uma.
+    if codificacao is None or codificacao in codificacoes:
+        return codificacoes, codificacao
+    if len(codificacoes[None]) < TAMANHO_MINIMO:
+        return codificacoes, None
+    return {**codificacoes, codificacao: comprimir(codificacoes[None], codificacao, niveis)}, codificacao
+
+
+def comprimivel(resposta):
+    return (
+        resposta.status_code == 200
+        and not resposta.direct_passthrough
+        and not resposta.is_streamed
+        and 'Content-Encoding' not in resposta.headers
+        and 'ETag' not in resposta.headers
+        and (resposta.mimetype or '').startswith(TIPOS_COMPRIMIVEIS)
+        and (resposta.content_length or 0) >= TAMANHO_MINIMO
+    )
+
+
+def aplicar(resposta, codificacoes, codificacao):
+    if codificacao not in codificacoes:
+        codificacao = None
+    resposta.set_data(codificacoes[codificacao])
+    if codificacao is not None:
+        resposta.headers['Content-Encoding'] = codificacao
+    resposta.vary.add('Accept-Encoding')
+    return resposta
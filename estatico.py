@@ -0,0 +1,281 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import time
+
+import numpy as np
+import plotly
+from plotly.io.json import to_json_plotly
+from plotly.offline import get_plotlyjs
+
+import app
+import compressao
+
+# Páginas somente leitura do dashboard, uma por valor do filtro de ano, com
+# os dados embutidos: qualquer servidor de arquivos estáticos as entrega.
+# O manifesto guarda a impressão dos dados de cada página para que uma nova
+# geração só refaça as que mudaram.
+MANIFESTO = 'manifesto.json'
+EXTENSOES = {'gzip': '.gz', 'br': '.br'}
+ATUAL = ' class="atual"'
+ARQUIVOS_GERADOR = [os.path.abspath(__file__), os.path.abspath(app.__file__)]
+
+CSS = f"""
+* {{ margin: 0; padding: 0; box-sizing: border-box; }}
+body {{
+    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+    background-color: {app.cores['background']};
+    color: {app.cores['text']};
+}}
+header {{
+    background-color: {app.cores['surface']};
+    padding: 24px 0;
+    border-bottom: 1px solid {app.cores['border']};
+    margin-bottom: 32px;
+    text-align: center;
+}}
+h1 {{ font-size: 2rem; font-weight: 600; }}
+header p {{ margin-top: 8px; color: {app.cores['muted']}; }}
+main {{ max-width: 1200px; margin: 0 auto; padding: 0 24px; }}
+nav {{ display: flex; flex-wrap: wrap; gap: 8px; margin-bottom: 32px; }}
+nav a {{
+    padding: 8px 16px;
+    border-radius: 6px;
+    border: 1px solid {app.cores['border']};
+    color: {app.cores['primary']};
+    font-size: 0.875rem;
+    text-decoration: none;
+}}
+nav a.atual {{ background-color: {app.cores['primary']}; color: white; }}
+.cards {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(240px, 1fr)); gap: 16px; margin-bottom: 32px; }}
+section {{
+    background-color: {app.cores['surface']};
+    padding: 24px;
+    border-radius: 8px;
+    border: 1px solid {app.cores['border']};
+    margin-bottom: 24px;
+}}
+h3 {{ margin-bottom: 24px; font-size: 1.125rem; font-weight: 600; }}
+.tabela {{ overflow-x: auto; }}
+table {{ width: 100%; border-collapse: collapse; font-size: 14px; }}
+th, td {{ padding: 12px; text-align: center; border-bottom: 1px solid {app.cores['border']}; }}
+th {{ background-color: {app.cores['background']}; font-weight: 600; border-bottom-width: 2px; }}
+td.alta {{ color: {app.cores['success']}; font-weight: 500; }}
+td.baixa {{ color: {app.cores['secondary']}; font-weight: 500; }}
+"""
+
+COLUNAS_TABELA = [('Período', 'mes_ano'), ('Receita', 'receita_formatada'), ('Despesas', 'despesas_formatada'),
+                  ('Lucro', 'lucro_formatado'), ('Margem (%)', 'margem')]
+
+
+def nome_pagina(ano):
+    return f'{ano}.html'
+
+
+def aplicar_patch(figura, patch):
+    # Os callbacks devolvem Patch; aqui as atribuições são aplicadas à
+    # figura base, como o Dash faz no navegador.
+    for operacao in patch['operations']:
+        if operacao['operation'] != 'Assign':
+            raise ValueError(f"Operação de patch não suportada: {operacao['operation']}")
+        *caminho, ultimo = operacao['location']
+        alvo = figura
+        for passo, seguinte in zip(caminho, [*caminho[1:], ultimo]):
+            alvo = alvo[passo] if isinstance(alvo, list) else alvo.setdefault(passo, [] if isinstance(seguinte, int) else {})
+        alvo[ultimo] = operacao['params']['value']
+    return figura
+
+
+def _css(estilo):
+    return ';'.join(f"{re.sub('([A-Z])', lambda m: '-' + m[1].lower(), chave)}:{valor}" for chave, valor in estilo.items())
+
+
+def renderizar_componente(componente):
+    # Só os componentes de dash.html, que é o que os cards usam.
+    if componente is None:
+        return ''
+    if isinstance(componente, list):
+        return ''.join(renderizar_componente(filho) for filho in componente)
+    if not isinstance(componente, dict):
+        return html.escape(str(componente))
+    if componente.get('namespace') != 'dash_html_components':
+        raise ValueError(f"Componente não suportado: {componente.get('namespace')}.{componente.get('type')}")
+    tag, props = componente['type'].lower(), componente['props']
+    estilo = f' style="{html.escape(_css(props["style"]))}"' if props.get('style') else ''
+    return f'<{tag}{estilo}>{renderizar_componente(props.get("children"))}</{tag}>'
+
+
+def renderizar_grafico(identificador, base, patch, altura, config):
+    figura = aplicar_patch(base.to_plotly_json(), patch)
+    # </ dentro do JSON fecharia o <script>.
+    dados = to_json_plotly(figura).replace('</', '<\\/')
+    return (
+        f'<div id="{identificador}" style="height:{altura}"></div>'
+        f'<script>(function () {{ const f = {dados}; '
+        f'Plotly.newPlot("{identificador}", f.data, f.layout, {json.dumps(config)}); }})();</script>'
+    )
+
+
+def renderizar_tabela(tabela):
+    margem = tabela['margem'].to_numpy()
+    classes = np.where(margem > 50, ' class="alta"', np.where(margem < 30, ' class="baixa"', ''))
+    textos_margem = ['' if np.isnan(valor) else f'{valor:.1f}' for valor in margem.tolist()]
+    colunas = [[html.escape(str(valor)) for valor in tabela[coluna].tolist()] for _, coluna in COLUNAS_TABELA[:-1]]
+    linhas = ''.join(
+        '<tr>' + ''.join(f'<td{classe}>{valor}</td>' for valor in valores) + f'<td{classe}>{texto}</td></tr>'
+        for *valores, classe, texto in zip(*colunas, classes.tolist(), textos_margem)
+    )
+    cabecalho = ''.join(f'<th>{nome}</th>' for nome, _ in COLUNAS_TABELA)
+    return f'<div class="tabela"><table><thead><tr>{cabecalho}</tr></thead><tbody>{linhas}</tbody></table></div>'
+
+
+def renderizar_snapshot(atual, ano, anos, script_plotly):
+    coleta = app.ColetaSaidas()
+    cards = app.saida_cards(ano, None, None, atual, coleta)
+    principal = app.saida_grafico_principal(ano, None, None, 'mes', atual, coleta)
+    anual = app.saida_grafico_anual(ano, None, None, atual, coleta)
+    tendencia, crescimento = app.saida_analises(ano, atual, coleta)
+    titulo = "Todos os Anos" if ano == 'todos' else f"Ano {ano}"
+
+    navegacao = ''.join(
+        f'<a href="{nome_pagina(opcao)}"{ATUAL if opcao == ano else ""}>{"Todos os Anos" if opcao == "todos" else opcao}</a>'
+        for opcao in ['todos', *anos]
+    )
+    secoes = [
+        ('Evolução Mensal', renderizar_grafico('grafico-principal', app.figura_principal_base(), principal, '400px', app.config_grafico_principal)),
+        ('Comparativo Anual', renderizar_grafico('grafico-anual', app.figura_anual_base(), anual, '350px', app.config_grafico)),
+        ('Análises', renderizar_grafico('grafico-tendencia', app.figura_tendencia_base(), tendencia, '350px', app.config_grafico)
+         + renderizar_grafico('grafico-crescimento', app.figura_crescimento_base(), crescimento, '350px', app.config_grafico)),
+        ('Detalhamento', renderizar_tabela(app.obter_visao(ano, atual)['tabela']))
+    ]
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Dashboard - {titulo}</title>
+<style>{CSS}</style>
+{script_plotly}
+</head>
+<body>
+<header><h1>Dashboard</h1><p>Dashboard Financeiro - {titulo}</p></header>
+<main>
+<nav>{navegacao}</nav>
+<div class="cards">{renderizar_componente(cards)}</div>
+{''.join(f'<section><h3>{nome}</h3>{conteudo}</section>' for nome, conteudo in secoes)}
+</main>
+</body>
+</html>
+""".encode('utf-8')
+
+
+def impressao_gerador(*opcoes):
+    # Mudou o código que monta as páginas ou a forma de gravá-las, mudam todas.
+    resumo = hashlib.blake2b(json.dumps([plotly.__version__, *opcoes]).encode(), digest_size=16)
+    for caminho in ARQUIVOS_GERADOR:
+        with open(caminho, 'rb') as arquivo:
+            resumo.update(arquivo.read())
+    return resumo.hexdigest()
+
+
+def impressao_dados(atual, ano, anos):
+    # Tudo o que uma página mostra sai das linhas do ano (ou de todas) e das
+    # análises, que também olham o ano anterior; a lista de anos entra pela
+    # navegação.
+    resumo = hashlib.blake2b(json.dumps([str(ano), anos]).encode('utf-8'), digest_size=16)
+    linhas = atual['cubo'][ano]['linhas']
+    for coluna in ['data', *app.COLUNAS_VALORES]:
+        resumo.update(np.ascontiguousarray(linhas[coluna].to_numpy()).tobytes())
+    analises = atual['analises'][ano]
+    for coluna in ['data', *app.COLUNAS_TENDENCIA, *app.COLUNAS_CRESCIMENTO]:
+        resumo.update(np.ascontiguousarray(analises[coluna].to_numpy()).tobytes())
+    return resumo.hexdigest()
+
+
+def gravar(saida, nome, conteudo, comprimir):
+    # Grava num temporário e troca: um servidor lendo a pasta nunca vê um
+    # arquivo pela metade.
+    variantes = compressao.variantes(conteudo) if comprimir else {None: conteudo}
+    for codificacao, dados in variantes.items():
+        caminho = os.path.join(saida, nome + EXTENSOES.get(codificacao, ''))
+        with open(caminho + '.tmp', 'wb') as arquivo:
+            arquivo.write(dados)
+        os.replace(caminho + '.tmp', caminho)
+
+
+def remover(saida, nome):
+    for extensao in ['', *EXTENSOES.values()]:
+        caminho = os.path.join(saida, nome + extensao)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def gerar(saida, oficina=None, embutir_plotly=False, comprimir=False, forcar=False):
+    os.makedirs(saida, exist_ok=True)
+    atual, _ = app.contexto_oficina(oficina or app.OFICINA)
+    anos = sorted(chave for chave in atual['cubo'] if chave != 'todos')
+
+    caminho_manifesto = os.path.join(saida, MANIFESTO)
+    try:
+        with open(caminho_manifesto, encoding='utf-8') as arquivo:
+            manifesto = json.load(arquivo)
+    except (OSError, ValueError):
+        manifesto = {}
+    gerador = impressao_gerador(embutir_plotly, comprimir)
+    anteriores = manifesto.get('paginas', {}) if manifesto.get('gerador') == gerador and not forcar else {}
+
+    if embutir_plotly:
+        script_plotly = f'<script>{get_plotlyjs()}</script>'
+    else:
+        nome_plotly = f'plotly-{plotly.__version__}.min.js'
+        if forcar or not os.path.exists(os.path.join(saida, nome_plotly)):
+            gravar(saida, nome_plotly, get_plotlyjs().encode('utf-8'), comprimir)
+        script_plotly = f'<script src="{nome_plotly}"></script>'
+
+    paginas, geradas = {}, []
+    for ano in ['todos', *anos]:
+        nome = nome_pagina(ano)
+        paginas[nome] = impressao_dados(atual, ano, anos)
+        if anteriores.get(nome) == paginas[nome] and os.path.exists(os.path.join(saida, nome)):
+            continue
+        gravar(saida, nome, renderizar_snapshot(atual, ano, anos, script_plotly), comprimir)
+        geradas.append(nome)
+
+    # A página inicial é barata: é refeita e só gravada se mudou.
+    inicial = app.renderizar_pagina_inicial(atual, destino=nome_pagina('todos')).encode('utf-8')
+    paginas['index.html'] = hashlib.blake2b(inicial, digest_size=16).hexdigest()
+    if anteriores.get('index.html') != paginas['index.html'] or not os.path.exists(os.path.join(saida, 'index.html')):
+        gravar(saida, 'index.html', inicial, comprimir)
+        geradas.append('index.html')
+
+    removidas = [nome for nome in manifesto.get('paginas', {}) if nome not in paginas]
+    for nome in removidas:
+        remover(saida, nome)
+
+    gravar(saida, MANIFESTO, json.dumps({'gerador': gerador, 'paginas': paginas}, indent=2).encode('utf-8'), False)
+    return {'geradas': geradas, 'inalteradas': len(paginas) - len(geradas), 'removidas': removidas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera páginas estáticas do dashboard, uma por ano do filtro")
+    parser.add_argument('saida', help="diretório de saída")
+    parser.add_argument('--oficina', help="oficina a exportar (padrão: DASHBOARD_OFICINA)")
+    parser.add_argument('--embutir-plotly', action='store_true',
+                        help="põe o plotly.js dentro de cada página em vez de um arquivo compartilhado")
+    parser.add_argument('--comprimir', action='store_true', help="grava também as variantes .gz e .br")
+    parser.add_argument('--forcar', action='store_true', help="refaz todas as páginas")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resultado = gerar(args.saida, args.oficina, args.embutir_plotly, args.comprimir, args.forcar)
+    print(f"{len(resultado['geradas'])} página(s) gerada(s), {resultado['inalteradas']} sem mudança, "
+          f"{len(resultado['removidas'])} removida(s) em {time.perf_counter() - inicio:.2f} s")
+    for nome in resultado['geradas']:
+        print(f"  {os.path.join(args.saida, nome)}")
+
+
+if __name__ == '__main__':
+    main()
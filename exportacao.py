@@ -0,0 +1,181 @@
+import math
+import queue
+import threading
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+# Limite de linhas de uma planilha do Excel, contando o cabeçalho.
+LINHAS_POR_PLANILHA = 1_048_576
+EPOCA_EXCEL = np.datetime64('1899-12-30', 'D')
+
+NAMESPACE = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELACOES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACOTE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+def csv_em_partes(blocos):
+    # BOM para o Excel reconhecer UTF-8; datas ISO e números sem formatação.
+    cabecalho = True
+    for bloco in blocos:
+        texto = bloco.to_csv(index=False, header=cabecalho, date_format='%Y-%m-%d', lineterminator='\n')
+        yield (('\ufeff' if cabecalho else '') + texto).encode('utf-8')
+        cabecalho = False
+
+
+class _Saida:
+    # Destino sem seek para o zipfile: ele grava descritores de dados no
+    # lugar de voltar aos cabeçalhos, e os bytes são drenados a cada bloco.
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados, self._partes = b''.join(self._partes), []
+        return dados
+
+
+def _celulas(valores):
+    if np.issubdtype(valores.dtype, np.datetime64):
+        dias = (valores.astype('datetime64[D]') - EPOCA_EXCEL).astype(np.int64)
+        return [f'<c s="1"><v>{dia}</v></c>' for dia in dias.tolist()]
+    if np.issubdtype(valores.dtype, np.number):
+        return [f'<c><v>{valor!r}</v></c>' if math.isfinite(valor) else '<c/>' for valor in valores.tolist()]
+    return [f'<c t="inlineStr"><is><t>{escape(str(valor))}</t></is></c>' for valor in valores.tolist()]
+
+
+def _linhas_xml(bloco):
+    colunas = [_celulas(bloco[coluna].to_numpy()) for coluna in bloco.columns]
+    return ''.join('<row>' + ''.join(celulas) + '</row>' for celulas in zip(*colunas)).encode('utf-8')
+
+
+def _linha_cabecalho(colunas):
+    return ('<row>' + ''.join(f'<c t="inlineStr"><is><t>{escape(c)}</t></is></c>' for c in colunas) + '</row>').encode('utf-8')
+
+
+def xlsx_em_partes(blocos, colunas, total_linhas=None):
+    # Monta o pacote OOXML mínimo à mão, uma planilha por vez, para não
+    # depender de uma biblioteca que guarda a pasta inteira na memória.
+    saida = _Saida()
+    pacote = zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED, compresslevel=6)
+    zip64 = total_linhas is None or total_linhas > 200_000
+    planilhas, arquivo, linhas_na_planilha = 0, None, 0
+
+    def abrir_planilha():
+        nonlocal planilhas, arquivo, linhas_na_planilha
+        planilhas += 1
+        arquivo = pacote.open(f'xl/worksheets/sheet{planilhas}.xml', 'w', force_zip64=zip64)
+        arquivo.write(f'{XML}<worksheet xmlns="{NAMESPACE}"><sheetData>'.encode('utf-8'))
+        arquivo.write(_linha_cabecalho(colunas))
+        linhas_na_planilha = 1
+
+    def fechar_planilha():
+        arquivo.write(b'</sheetData></worksheet>')
+        arquivo.close()
+
+    abrir_planilha()
+    for bloco in blocos:
+        while len(bloco):
+            if linhas_na_planilha == LINHAS_POR_PLANILHA:
+                fechar_planilha()
+                abrir_planilha()
+            parte = bloco.iloc[:LINHAS_POR_PLANILHA - linhas_na_planilha]
+            bloco = bloco.iloc[len(parte):]
+            arquivo.write(_linhas_xml(parte))
+            linhas_na_planilha += len(parte)
+        yield saida.drenar()
+    fechar_planilha()
+
+    nomes = range(1, planilhas + 1)
+    pacote.writestr('[Content_Types].xml', (
+        f'{XML}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        + ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for n in nomes
+        ) + '</Types>'
+    ))
+    pacote.writestr('_rels/.rels', (
+        f'{XML}<Relationships xmlns="{PACOTE}">'
+        f'<Relationship Id="rId1" Type="{RELACOES}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ))
+    pacote.writestr('xl/workbook.xml', (
+        f'{XML}<workbook xmlns="{NAMESPACE}" xmlns:r="{RELACOES}"><sheets>'
+        + ''.join(f'<sheet name="Dados {n}" sheetId="{n}" r:id="rId{n}"/>' for n in nomes)
+        + '</sheets></workbook>'
+    ))
+    pacote.writestr('xl/_rels/workbook.xml.rels', (
+        f'{XML}<Relationships xmlns="{PACOTE}">'
+        + ''.join(f'<Relationship Id="rId{n}" Type="{RELACOES}/worksheet" Target="worksheets/sheet{n}.xml"/>' for n in nomes)
+        + f'<Relationship Id="rId{planilhas + 1}" Type="{RELACOES}/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ))
+    # Estilo 1 é o formato de data embutido (14), usado pela coluna de datas.
+    pacote.writestr('xl/styles.xml', (
+        f'{XML}<styleSheet xmlns="{NAMESPACE}">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '</styleSheet>'
+    ))
+    pacote.close()
+    yield saida.drenar()
+
+
+def em_segundo_plano(executor, partes, tamanho_fila=8):
+    # As partes são produzidas numa thread do executor; a fila limitada
+    # segura o produtor quando o cliente lê devagar, e fechar o gerador
+    # (cliente desconectado) interrompe a produção.
+    fila = queue.Queue(tamanho_fila)
+    cancelado = threading.Event()
+    fim = object()
+
+    def entregar(item):
+        while not cancelado.is_set():
+            try:
+                fila.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produzir():
+        try:
+            for parte in partes:
+                if not entregar(parte):
+                    return
+            entregar(fim)
+        except Exception as erro:
+            entregar(erro)
+        finally:
+            partes.close()
+
+    executor.submit(produzir)
+    try:
+        while True:
+            item = fila.get()
+            if item is fim:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelado.set()
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import time
+
+import compartilhado
+
+# Com DASHBOARD_MEMORIA_COMPARTILHADA definido, o master sobe um processo
+# publicador que monta os dados uma vez e os publica nesse diretório; os
+# workers só anexam a versão publicada.
+DIRETORIO_COMPARTILHADO = os.environ.get('DASHBOARD_MEMORIA_COMPARTILHADA')
+ESPERA_PUBLICACAO = float(os.environ.get('DASHBOARD_ESPERA_PUBLICACAO', 60))
+
+# Com DASHBOARD_PRECARREGAR=1 o master importa o app, monta os dados e o
+# layout e aquece o Dash uma vez; os workers herdam tudo pelo fork.
+PRECARREGAR = os.environ.get('DASHBOARD_PRECARREGAR') == '1'
+preload_app = PRECARREGAR
+
+# O monitor de dados de cada worker é iniciado daqui, depois do aquecimento:
+# no post_fork com preload e no post_worker_init sem ele.
+os.environ['DASHBOARD_MONITOR_PELO_SERVIDOR'] = '1'
+
+publicador = None
+
+
+def on_starting(server):
+    global publicador
+    if not DIRETORIO_COMPARTILHADO:
+        return
+
+    versao_anterior = compartilhado.versao_publicada(DIRETORIO_COMPARTILHADO)
+    publicador = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')],
+        env={**os.environ, 'DASHBOARD_PUBLICADOR': '1'}
+    )
+
+    limite = time.monotonic() + ESPERA_PUBLICACAO
+    while compartilhado.versao_publicada(DIRETORIO_COMPARTILHADO) in (None, versao_anterior):
+        if publicador.poll() is not None:
+            raise RuntimeError(f"Publicador de dados terminou com código {publicador.returncode}")
+        if time.monotonic() > limite:
+            publicador.terminate()
+            raise RuntimeError("Publicador de dados não publicou a tempo")
+        time.sleep(0.1)
+    server.log.info("Dados publicados em %s", DIRETORIO_COMPARTILHADO)
+
+
+def when_ready(server):
+    if not PRECARREGAR:
+        return
+    app = sys.modules['app']
+    if DIRETORIO_COMPARTILHADO:
+        # O app foi importado antes de o publicador publicar.
+        app.sincronizar_compartilhado(compartilhado.versao_publicada(DIRETORIO_COMPARTILHADO))
+    registrar_aquecimento(server.log, app.aquecer())
+    server.log.info("App pré-carregado na versão %s dos dados", app.estado['versao'])
+
+
+def post_worker_init(worker):
+    # Sem preload cada worker importa o app por conta própria e se aquece
+    # antes de aceitar conexões; o monitor vem depois, porque o aquecimento
+    # cria processos por fork.
+    if not PRECARREGAR:
+        app = sys.modules['app']
+        registrar_aquecimento(worker.log, app.aquecer())
+        app.iniciar_monitor()
+
+
+def registrar_aquecimento(log, aquecimento):
+    if aquecimento is not None:
+        log.info(
+            "Aquecimento: %d saídas de %d oficina(s) em %.2f s com %d processo(s)",
+            aquecimento['saidas'], aquecimento['oficinas'], aquecimento['segundos'], aquecimento['processos']
+        )
+
+
+def post_fork(server, worker):
+    if PRECARREGAR:
+        sys.modules['app'].iniciar_monitor()
+
+
+def on_exit(server):
+    if publicador is not None and publicador.poll() is None:
+        publicador.terminate()
+        publicador.wait()
@@ -0,0 +1,193 @@
+import bisect
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BALDES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes, valores, extra=()):
+    pares = [*zip(nomes, valores), *extra]
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+def _formatar_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *rotulos, valor=1):
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def amostras(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for rotulos, valor in valores:
+            yield f'{self.nome}{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(valor)}'
+
+
+class Medidor:
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def definir(self, valor, *rotulos):
+        with self._lock:
+            self._valores[rotulos] = valor
+
+    def remover(self, *rotulos):
+        with self._lock:
+            self._valores.pop(rotulos, None)
+
+    def amostras(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for rotulos, valor in valores:
+            yield f'{self.nome}{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(valor)}'
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), baldes=BALDES_PADRAO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.baldes = tuple(sorted(baldes))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *rotulos):
+        indice = bisect.bisect_left(self.baldes, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [[0] * (len(self.baldes) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def medir(self, *rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *rotulos)
+
+    def cronometrar(self, *rotulos):
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def medida(*args, **kwargs):
+                with self.medir(*rotulos):
+                    return funcao(*args, **kwargs)
+            return medida
+        return decorador
+
+    def amostras(self):
+        with self._lock:
+            series = sorted((rotulos, list(contagens), soma) for rotulos, (contagens, soma) in self._series.items())
+        for rotulos, contagens, soma in series:
+            acumulado = 0
+            for limite, contagem in zip((*self.baldes, float('inf')), contagens):
+                acumulado += contagem
+                yield f'{self.nome}_bucket{_formatar_rotulos(self.rotulos, rotulos, [("le", _formatar_numero(limite))])} {acumulado}'
+            yield f'{self.nome}_sum{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(soma)}'
+            yield f'{self.nome}_count{_formatar_rotulos(self.rotulos, rotulos)} {acumulado}'
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = []
+        self._coletores = []
+
+    def contador(self, nome, ajuda, rotulos=()):
+        metrica = Contador(nome, ajuda, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        metrica = Medidor(nome, ajuda, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nome, ajuda, rotulos=(), baldes=BALDES_PADRAO):
+        metrica = Histograma(nome, ajuda, rotulos, baldes)
+        self._metricas.append(metrica)
+        return metrica
+
+    def coletor(self, funcao):
+        # Valores lidos só na hora da coleta: funcao() devolve tuplas
+        # (nome, tipo, ajuda, valor).
+        self._coletores.append(funcao)
+        return funcao
+
+    def exportar(self):
+        linhas = []
+        for metrica in self._metricas:
+            linhas.append(f'# HELP {metrica.nome} {metrica.ajuda}')
+            linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+            linhas.extend(metrica.amostras())
+        for coletor in self._coletores:
+            for nome, tipo, ajuda, valor in coletor():
+                linhas.append(f'# HELP {nome} {ajuda}')
+                linhas.append(f'# TYPE {nome} {tipo}')
+                linhas.append(f'{nome} {_formatar_numero(valor)}')
+        return '\n'.join(linhas) + '\n'
+
+
+class PerfisLentos:
+    def __init__(self, limite_segundos, taxa_amostragem=0.1, linhas=25):
+        self.limite_segundos = limite_segundos
+        self.taxa_amostragem = taxa_amostragem
+        self.linhas = linhas
+        # cProfile não aceita dois perfis ativos ao mesmo tempo em todas as
+        # versões do Python; requisições concorrentes simplesmente não são
+        # amostradas.
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        if random.random() >= self.taxa_amostragem or not self._lock.acquire(blocking=False):
+            return None
+        perfil = cProfile.Profile()
+        perfil.enable()
+        return perfil
+
+    def finalizar(self, perfil, descricao, duracao):
+        perfil.disable()
+        self._lock.release()
+        if duracao < self.limite_segundos:
+            return
+        saida = io.StringIO()
+        pstats.Stats(perfil, stream=saida).sort_stats('cumulative').print_stats(self.linhas)
+        logger.warning("Requisição lenta: %s levou %.1f ms\n%s", descricao, duracao * 1000, saida.getvalue())
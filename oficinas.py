@@ -0,0 +1,150 @@
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+AMOSTRA_TEXTO = 1000
+
+
+def medir_memoria(objeto, vistos=None):
+    # Estimativa em bytes. Arrays que são visões de outro (as fatias de ano
+    # sobre o df, por exemplo) contam uma vez só, pela base.
+    vistos = set() if vistos is None else vistos
+    if isinstance(objeto, pd.DataFrame):
+        return sum(medir_memoria(objeto[coluna], vistos) for coluna in objeto.columns)
+    if isinstance(objeto, (pd.Series, pd.Index)):
+        if isinstance(objeto.dtype, pd.CategoricalDtype):
+            return medir_memoria(objeto.cat.codes.to_numpy(), vistos) + medir_memoria(objeto.cat.categories, vistos)
+        if objeto.dtype.kind in 'biufcmM':
+            return medir_memoria(objeto.to_numpy(), vistos)
+        # Texto é medido numa amostra: medir cada string custaria tanto
+        # quanto montar a tabela.
+        passo = max(1, len(objeto) // AMOSTRA_TEXTO)
+        if isinstance(objeto, pd.Series):
+            bytes_amostra = objeto.iloc[::passo].memory_usage(index=False, deep=True)
+        else:
+            bytes_amostra = objeto[::passo].memory_usage(deep=True)
+        return int(bytes_amostra * passo)
+    if isinstance(objeto, np.ndarray):
+        base = objeto
+        while isinstance(base.base, np.ndarray):
+            base = base.base
+        if id(base) in vistos:
+            return 0
+        vistos.add(id(base))
+        return base.nbytes
+    if isinstance(objeto, dict):
+        return sum(medir_memoria(valor, vistos) for valor in objeto.values())
+    if isinstance(objeto, (list, tuple)):
+        return sum(medir_memoria(valor, vistos) for valor in objeto)
+    return sys.getsizeof(objeto)
+
+
+class GerenciadorOficinas:
+    def __init__(self, carregar, medir, orcamento_bytes, ao_medir=None, ao_remover=None):
+        self.carregar = carregar
+        self.medir = medir
+        self.orcamento_bytes = orcamento_bytes
+        self.ao_medir = ao_medir
+        self.ao_remover = ao_remover
+        self.cargas = 0
+        self.remocoes = 0
+        self._entradas = OrderedDict()
+        self._carregando = {}
+        self._lock = threading.Lock()
+
+    def obter(self, oficina):
+        with self._lock:
+            if oficina in self._entradas:
+                self._entradas.move_to_end(oficina)
+                return self._entradas[oficina][0]
+            carga = self._carregando.get(oficina)
+            dono = carga is None
+            if dono:
+                carga = self._carregando[oficina] = Future()
+
+        # Só quem pede a mesma oficina espera a carga; oficinas já carregadas
+        # seguem respondendo, porque a carga roda fora do lock.
+        if not dono:
+            return carga.result()
+        try:
+            valor = self.carregar(oficina)
+            tamanho = self.medir(valor)
+        except BaseException as erro:
+            with self._lock:
+                del self._carregando[oficina]
+            carga.set_exception(erro)
+            raise
+
+        with self._lock:
+            self._entradas[oficina] = (valor, tamanho)
+            del self._carregando[oficina]
+            self.cargas += 1
+            removidas = self._liberar(manter=oficina)
+        carga.set_result(valor)
+        self._notificar(oficina, tamanho, removidas)
+        return valor
+
+    def medir_novamente(self, oficina):
+        # O tamanho cresce depois da carga, conforme os caches da oficina
+        # enchem; passar do orçamento remove as outras menos usadas.
+        valor = self.carregada(oficina)
+        if valor is None:
+            return None
+        tamanho = self.medir(valor)
+        with self._lock:
+            entrada = self._entradas.get(oficina)
+            if entrada is None or entrada[0] is not valor:
+                return None
+            if entrada[1] == tamanho:
+                return tamanho
+            self._entradas[oficina] = (valor, tamanho)
+            removidas = self._liberar(manter=oficina)
+        self._notificar(oficina, tamanho, removidas)
+        return tamanho
+
+    def _notificar(self, oficina, tamanho, removidas):
+        if self.ao_medir is not None:
+            self.ao_medir(oficina, tamanho)
+        for nome, tamanho_removido in removidas:
+            logger.info("Oficina %s removida da memória (%d bytes)", nome, tamanho_removido)
+            if self.ao_remover is not None:
+                self.ao_remover(nome)
+
+    def _liberar(self, manter):
+        # Remove as menos usadas até caber no orçamento; a recém-carregada
+        # fica mesmo que sozinha passe dele.
+        removidas = []
+        total = sum(tamanho for _, tamanho in self._entradas.values())
+        for nome in list(self._entradas):
+            if total <= self.orcamento_bytes:
+                break
+            if nome == manter:
+                continue
+            _, tamanho = self._entradas.pop(nome)
+            total -= tamanho
+            self.remocoes += 1
+            removidas.append((nome, tamanho))
+        return removidas
+
+    def carregada(self, oficina):
+        with self._lock:
+            entrada = self._entradas.get(oficina)
+            return None if entrada is None else entrada[0]
+
+    def remover(self, oficina):
+        with self._lock:
+            removida = self._entradas.pop(oficina, None) is not None
+        if removida and self.ao_remover is not None:
+            self.ao_remover(oficina)
+        return removida
+
+    def tamanhos(self):
+        with self._lock:
+            return {oficina: tamanho for oficina, (_, tamanho) in self._entradas.items()}
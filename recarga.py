@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def mesclar_dados(*fontes):
+    dados = {}
+    for fonte in fontes:
+        for ano, meses in fonte.items():
+            dados.setdefault(str(ano), {}).update(meses)
+    return dados
+
+
+def meses_alterados(dados_atuais, novos_dados):
+    alterados = {}
+    for ano, meses in novos_dados.items():
+        for mes, valores in meses.items():
+            if dados_atuais.get(str(ano), {}).get(mes) != valores:
+                alterados.setdefault(str(ano), {})[mes] = valores
+    return alterados
+
+
+def _arquivos_json(diretorio):
+    with os.scandir(diretorio) as entradas:
+        return sorted(
+            (entrada.path, entrada.stat())
+            for entrada in entradas
+            if entrada.is_file() and entrada.name.endswith('.json')
+        )
+
+
+def carregar_diretorio(diretorio):
+    fontes = []
+    for caminho, _ in _arquivos_json(diretorio):
+        with open(caminho, encoding='utf-8') as arquivo:
+            fontes.append(json.load(arquivo))
+    return mesclar_dados(*fontes)
+
+
+class MonitorDiretorio:
+    def __init__(self, diretorio, ao_alterar, intervalo=5.0):
+        self.diretorio = diretorio
+        self.ao_alterar = ao_alterar
+        self.intervalo = intervalo
+        self._vistos = {}
+        self._parar = threading.Event()
+        self._thread = None
+
+    def verificar(self):
+        fontes = []
+        for caminho, info in _arquivos_json(self.diretorio):
+            assinatura = (info.st_mtime_ns, info.st_size)
+            if self._vistos.get(caminho) == assinatura:
+                continue
+            try:
+                with open(caminho, encoding='utf-8') as arquivo:
+                    fontes.append(json.load(arquivo))
+            except (OSError, ValueError):
+                # Arquivo ainda sendo escrito; tenta de novo na próxima volta.
+                logger.warning("Não foi possível ler %s", caminho, exc_info=True)
+                continue
+            self._vistos[caminho] = assinatura
+
+        if fontes:
+            self.ao_alterar(mesclar_dados(*fontes))
+        return bool(fontes)
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.verificar()
+            except Exception:
+                logger.exception("Falha ao recarregar dados de %s", self.diretorio)
+
+    def iniciar(self):
+        if self._thread is None:
+            self.verificar()
+            self._thread = threading.Thread(target=self._executar, name='monitor-dados', daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,289 @@
+import fcntl
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import signal
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from multiprocessing.connection import wait
+
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.background_callback._proxy_set_props import ProxySetProps
+from dash.background_callback.managers import BaseBackgroundCallbackManager
+from dash.exceptions import PreventUpdate
+
+logger = logging.getLogger(__name__)
+
+# Arquivos dentro da pasta de cada tarefa, que é nomeada pela chave do Dash
+# (hash da função e dos argumentos).
+PENDENTE = 'pendente'
+PID = 'pid'
+RESULTADO = 'resultado'
+PROGRESSO = 'progresso'
+PROPRIEDADES = 'propriedades'
+CANCELADA = 'cancelada'
+EXECUCAO = 'execucao'
+PREFIXO_ESPERA = 'espera-'
+
+
+def _gravar(pasta, nome, valor):
+    caminho = os.path.join(pasta, nome)
+    with open(caminho + '.tmp', 'wb') as arquivo:
+        pickle.dump(valor, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _ler(pasta, nome, padrao=None, apagar=False):
+    caminho = os.path.join(pasta, nome)
+    try:
+        with open(caminho, 'rb') as arquivo:
+            valor = pickle.load(arquivo)
+    except FileNotFoundError:
+        return padrao
+    if apagar:
+        _apagar(pasta, nome)
+    return valor
+
+
+def _apagar(pasta, nome):
+    try:
+        os.remove(os.path.join(pasta, nome))
+    except FileNotFoundError:
+        pass
+
+
+def _existe(pasta, nome):
+    return os.path.exists(os.path.join(pasta, nome))
+
+
+class FilaTarefas(BaseBackgroundCallbackManager):
+    # Gerenciador de callbacks em segundo plano do Dash sem dependências
+    # externas. O estado de cada tarefa fica em disco, então qualquer worker
+    # do gunicorn responde às consultas do navegador; o cálculo roda num
+    # processo criado por fork, que herda os dados já carregados e pode ser
+    # morto no cancelamento. Pedidos iguais enquanto a tarefa está pendente,
+    # ou até o resultado expirar, esperam a mesma tarefa.
+    def __init__(self, diretorio, processos=2, limite_segundos=300, expirar_segundos=300):
+        self.diretorio = diretorio
+        self.limite_segundos = limite_segundos
+        self.expirar_segundos = expirar_segundos
+        self.iniciadas = 0
+        self.compartilhadas = 0
+        self.canceladas = 0
+        self.esgotadas = 0
+        self.em_execucao = 0
+        os.makedirs(diretorio, exist_ok=True)
+        self._executor = ThreadPoolExecutor(processos, thread_name_prefix='tarefa')
+        self._contexto = multiprocessing.get_context('fork')
+        super().__init__(cache_by=None)
+
+    @contextmanager
+    def _travar(self):
+        # Trava entre processos: os workers compartilham o diretório.
+        with open(os.path.join(self.diretorio, '.trava'), 'a') as arquivo:
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+    def _pasta(self, chave):
+        return os.path.join(self.diretorio, chave)
+
+    @staticmethod
+    def _separar(tarefa):
+        chave, _, espera = str(tarefa).partition('.')
+        return chave, espera
+
+    def _esperas(self, pasta):
+        return [nome for nome in os.listdir(pasta) if nome.startswith(PREFIXO_ESPERA)]
+
+    def _limpar(self):
+        # Resultados ninguém mais espera e que passaram do prazo.
+        limite = time.time() - self.expirar_segundos
+        for nome in os.listdir(self.diretorio):
+            pasta = self._pasta(nome)
+            if not os.path.isdir(pasta) or _existe(pasta, PENDENTE) or self._esperas(pasta):
+                continue
+            if os.path.getmtime(pasta) < limite:
+                shutil.rmtree(pasta, ignore_errors=True)
+
+    def call_job_fn(self, key, job_fn, args, context):
+        pasta = self._pasta(key)
+        espera = uuid.uuid4().hex
+        with self._travar():
+            self._limpar()
+            nova = not _existe(pasta, RESULTADO) and (not _existe(pasta, PENDENTE) or _existe(pasta, CANCELADA))
+            if nova:
+                # Pasta de uma tarefa cancelada ou que falhou sem resultado.
+                execucao = uuid.uuid4().hex
+                shutil.rmtree(pasta, ignore_errors=True)
+                os.makedirs(pasta)
+                open(os.path.join(pasta, PENDENTE), 'w').close()
+                _gravar(pasta, EXECUCAO, execucao)
+            open(os.path.join(pasta, PREFIXO_ESPERA + espera), 'w').close()
+            os.utime(pasta)
+        if nova:
+            self.iniciadas += 1
+            self._executor.submit(self._executar, pasta, execucao, job_fn, args, context)
+        else:
+            self.compartilhadas += 1
+        return f'{key}.{espera}'
+
+    def _executar(self, pasta, execucao, job_fn, args, context):
+        # A pasta pode ter sido refeita por um pedido novo depois de um
+        # cancelamento; a execução antiga então não mexe mais nela.
+        with self._travar():
+            if _ler(pasta, EXECUCAO) != execucao:
+                return
+            if _existe(pasta, CANCELADA):
+                _apagar(pasta, PENDENTE)
+                return
+            processo = self._contexto.Process(target=job_fn, args=(pasta, args, context), daemon=True)
+            processo.start()
+            with open(os.path.join(pasta, PID), 'w') as arquivo:
+                arquivo.write(str(processo.pid))
+        self.em_execucao += 1
+        try:
+            # Espera pelo sentinel em vez de join: o pid só é liberado depois
+            # de sair do arquivo, então um cancelamento nunca mata outro
+            # processo que tenha herdado o número.
+            if not wait([processo.sentinel], self.limite_segundos):
+                self.esgotadas += 1
+                logger.warning("Tarefa %s passou de %d s e foi interrompida", os.path.basename(pasta), self.limite_segundos)
+                processo.kill()
+                wait([processo.sentinel])
+            with self._travar():
+                if _ler(pasta, EXECUCAO) == execucao:
+                    if not _existe(pasta, RESULTADO) and not _existe(pasta, CANCELADA):
+                        _gravar(pasta, RESULTADO, {'background_callback_error': {
+                            'msg': f"tempo limite de {self.limite_segundos} s esgotado" if processo.exitcode == -signal.SIGKILL
+                            else f"processo da tarefa terminou com código {processo.exitcode}",
+                            'tb': ''
+                        }})
+                    _apagar(pasta, PID)
+                    _apagar(pasta, PENDENTE)
+                    os.utime(pasta)
+            processo.join()
+        finally:
+            self.em_execucao -= 1
+
+    def terminate_job(self, job):
+        # O Dash chama isto quando um pedido deixa de esperar (filtro mudou ou
+        # o resultado já foi entregue); a tarefa só é cancelada quando não
+        # resta ninguém esperando por ela.
+        if job is None:
+            return
+        chave, espera = self._separar(job)
+        pasta = self._pasta(chave)
+        with self._travar():
+            if not os.path.isdir(pasta):
+                return
+            _apagar(pasta, PREFIXO_ESPERA + espera)
+            if self._esperas(pasta) or not _existe(pasta, PENDENTE) or _existe(pasta, CANCELADA):
+                return
+            open(os.path.join(pasta, CANCELADA), 'w').close()
+            try:
+                with open(os.path.join(pasta, PID)) as arquivo:
+                    os.kill(int(arquivo.read()), signal.SIGKILL)
+            except (FileNotFoundError, ProcessLookupError):
+                pass
+        self.canceladas += 1
+
+    def terminate_unhealthy_job(self, job):
+        if self.job_running(job):
+            return False
+        self.terminate_job(job)
+        return True
+
+    def job_running(self, job):
+        if job is None:
+            return False
+        pasta = self._pasta(self._separar(job)[0])
+        return _existe(pasta, PENDENTE) and not _existe(pasta, CANCELADA)
+
+    def make_job_fn(self, fn, progress, key=None):
+        return _criar_tarefa(fn, progress)
+
+    def clear_cache_entry(self, key):
+        with self._travar():
+            shutil.rmtree(self._pasta(key), ignore_errors=True)
+
+    def get_or_create_signing_secret(self, generate):
+        caminho = os.path.join(self.diretorio, '.segredo')
+        with self._travar():
+            if not os.path.exists(caminho):
+                descritor = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(descritor, 'wb') as arquivo:
+                    arquivo.write(generate())
+            with open(caminho, 'rb') as arquivo:
+                return arquivo.read()
+
+    def get_progress(self, key):
+        return _ler(self._pasta(key), PROGRESSO, apagar=True)
+
+    def result_ready(self, key):
+        return _existe(self._pasta(key), RESULTADO)
+
+    def get_result(self, key, job):
+        pasta = self._pasta(key)
+        resultado = _ler(pasta, RESULTADO, self.UNDEFINED)
+        if resultado is not self.UNDEFINED and job is not None:
+            # Entregue a este pedido; o arquivo fica para os outros que
+            # esperam e para pedidos iguais até expirar.
+            with self._travar():
+                _apagar(pasta, PREFIXO_ESPERA + self._separar(job)[1])
+        return resultado
+
+    def get_updated_props(self, key):
+        return _ler(self._pasta(key), PROPRIEDADES, {}, apagar=True)
+
+    def estatisticas(self):
+        return {
+            'iniciadas': self.iniciadas,
+            'compartilhadas': self.compartilhadas,
+            'canceladas': self.canceladas,
+            'esgotadas': self.esgotadas,
+            'em_execucao': self.em_execucao
+        }
+
+
+def _criar_tarefa(fn, progress):
+    # Roda no processo filho: grava progresso, set_props e o resultado na
+    # pasta da tarefa, como o DiskcacheManager faz no cache dele.
+    def tarefa(pasta, argumentos, contexto):
+        def definir_progresso(valor):
+            _gravar(pasta, PROGRESSO, list(valor) if isinstance(valor, (list, tuple)) else [valor])
+
+        def definir_propriedades(identificador, propriedades):
+            _gravar(pasta, PROPRIEDADES, {identificador: propriedades})
+
+        def executar():
+            valor_contexto = AttributeDict(**contexto)
+            valor_contexto.ignore_register_page = False
+            valor_contexto.updated_props = ProxySetProps(definir_propriedades)
+            context_value.set(valor_contexto)
+            extras = [definir_progresso] if progress else []
+            try:
+                if isinstance(argumentos, dict):
+                    resultado = fn(*extras, **argumentos)
+                elif isinstance(argumentos, (list, tuple)):
+                    resultado = fn(*extras, *argumentos)
+                else:
+                    resultado = fn(*extras, argumentos)
+            except PreventUpdate:
+                resultado = {'_dash_no_update': '_dash_no_update'}
+            except Exception as erro:
+                resultado = {'background_callback_error': {'msg': str(erro), 'tb': traceback.format_exc()}}
+            _gravar(pasta, RESULTADO, resultado)
+
+        copy_context().run(executar)
+
+    return tarefa